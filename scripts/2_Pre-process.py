@@ -9,17 +9,28 @@ import numpy as np
 import seaborn as sns
 import matplotlib.pyplot as plt
 import statsmodels.api as sm
+from gravitation_features import is_wide, gravitation_columns
+from competitor_features import competitor_columns
+from stage_io import read_stage, write_stage
+import imputer
+from report import show, finish
+from instrument import step, verbose
+
+# Column to compute the medians and modes per group of (e.g. "microcode" or "Comune"), None for global values.
+IMPUTE_BY = None
 
 # Load the datasets in dataframes
-stores_df = pd.read_csv("1_stores_with_microcodes.csv")
+with step("load") as s:
+    stores_df = s.record(read_stage("1_stores_with_microcodes"))
 
 # Explore the initial rows, data types and dimensions of the dataset
-print("Displaying the initial rows, data types and dimensions of the dataset.\n")
-print(stores_df.head(), stores_df.info(), stores_df.shape)
-print(stores_df.dtypes)
+if verbose():
+    print("Displaying the initial rows, data types and dimensions of the dataset.\n")
+    print(stores_df.head(), stores_df.info(), stores_df.shape)
+    print(stores_df.dtypes)
 
-# Check for duplicate values
-print("Number of duplicae rows:", stores_df.duplicated().sum())
+    # Check for duplicate values
+    print("Number of duplicae rows:", stores_df.duplicated().sum())
 
 # Check for missing values
 missing_values = stores_df.isnull()
@@ -47,70 +58,85 @@ num_cols = ["population",
         "population_age_65_up_yr",
         "annual_average"]
 
+# In the wide gravitation layout the slot columns take the place of daytype, time_slot, datatype and annual_average
+if is_wide(stores_df):
+    categorical_cols = ["microcode"]
+    num_cols = num_cols[:-1] + gravitation_columns(stores_df)
+
 # Plot histograms and qqplots of numerical features to check for normality
+def plot_normality_histograms(stores_df, num_cols):
+    fig, axes = plt.subplots(ncols = 4, nrows= 3, figsize = (10, 10))
+    sns.set_theme(style="ticks")
+
+    for i, ax in enumerate(axes.flat):
+        if i < len(num_cols):
+            sns.histplot(data=stores_df, x=num_cols[i], kde=True, ax=ax, edgecolor = ".3")
+            
+            ax.set_title(f'{num_cols[i]}')
+            ax.set_xlabel("")
+            ax.set_ylabel("")
+            ax.set_xticklabels("")
+            ax.set_yticklabels("")
+        else:
+            # If there are fewer columns than subplots, remove the empty subplots
+            fig.delaxes(ax) 
+
+def plot_qqplots(stores_df, num_cols):
+    fig, axes = plt.subplots(ncols = 4, nrows= 3, figsize = (10, 10))
+    sns.set_theme(style="ticks")
+
+    for i, ax in enumerate(axes.flat):
+        if i < len(num_cols):
+            sm.qqplot(data = stores_df[num_cols[i]], ax = ax, line = "45")
+            ax.set_title(f'{num_cols[i]}')
+            ax.set_xticklabels("")
+            ax.set_yticklabels("")
+            ax.tick_params(axis="x", which="both", bottom=False, top=False)
+            ax.set_xlabel("")
+            ax.set_ylabel("") 
+        else:
+            # If there are fewer columns than subplots, remove the empty subplots
+            fig.delaxes(ax) 
+
+# Only the columns that fit in the 4 x 3 grids are passed on
 print("Generating the Histograms.\n")
-fig, axes = plt.subplots(ncols = 4, nrows= 3, figsize = (10, 10))
-sns.set_theme(style="ticks")
-
-for i, ax in enumerate(axes.flat):
-    if i < len(num_cols):
-        sns.histplot(data=stores_df, x=num_cols[i], kde=True, ax=ax, edgecolor = ".3")
-        
-        ax.set_title(f'{num_cols[i]}')
-        ax.set_xlabel("")
-        ax.set_ylabel("")
-        ax.set_xticklabels("")
-        ax.set_yticklabels("")
-    else:
-        # If there are fewer columns than subplots, remove the empty subplots
-        fig.delaxes(ax) 
-
-plt.show()
+show("2_normality_histograms", plot_normality_histograms, stores_df[num_cols[:12]], num_cols[:12])
 
 print("Generating the QQPlots.\n")
-fig, axes = plt.subplots(ncols = 4, nrows= 3, figsize = (10, 10))
-sns.set_theme(style="ticks")
-
-for i, ax in enumerate(axes.flat):
-    if i < len(num_cols):
-        sm.qqplot(data = stores_df[num_cols[i]], ax = ax, line = "45")
-        ax.set_title(f'{num_cols[i]}')
-        ax.set_xticklabels("")
-        ax.set_yticklabels("")
-        ax.tick_params(axis="x", which="both", bottom=False, top=False)
-        ax.set_xlabel("")
-        ax.set_ylabel("") 
-    else:
-        # If there are fewer columns than subplots, remove the empty subplots
-        fig.delaxes(ax) 
-
-plt.show()
+show("2_qqplots", plot_qqplots, stores_df[num_cols[:12]], num_cols[:12])
 
 '''Observing the histograms and Q-Q plots, we have established that the features do not follow a normal distribution. Therefore, 
 imputing missing values will be performed using the median.'''
 
-# Impute missing values in the categorical featutes using mode
+# Impute missing values in the categorical featutes using mode and in the numerical features using median
 
 ## Converting relevant features to object type before imputing
 for col in ["microcode", "daytype", "time_slot"]:
-    stores_df[col] = stores_df[col].astype("object")
+    if col in stores_df:
+        stores_df[col] = stores_df[col].astype("object")
+
+# The competitor features are missing for stores without coordinates (and the hypermarket distance when there is no
+# hypermarket), they are filled with the medians too
+num_cols = num_cols + competitor_columns(stores_df)
 
-for col in categorical_cols:
-    stores_df[col].fillna(stores_df[col].mode().iloc[0], inplace=True)
+# Compute the modes and the medians of the numerical features in one pass and save them, so that prediction inputs
+# are filled with the same values
+with step("impute") as s:
+    imputation_stats = imputer.fit(stores_df, num_cols, categorical_cols, by = IMPUTE_BY)
+    imputer.save(imputation_stats)
+    stores_df = s.record(imputer.transform(stores_df, imputation_stats))
 
 print("Displaying the values after imputation:")
 print(stores_df[categorical_cols].isnull().sum())
 
-# Impute missing values in the numerical features using median
-for col in num_cols:
-    stores_df[col].fillna(stores_df[col].median(), inplace=True)
-
 print("Displaying the values after imputation:")
 print(stores_df[num_cols].isnull().sum())
 
 # Plot bar charts for all the categorical features for univariate analysis
 print("Generating the Bar Charts.\n")
 all_cat_cols = ["store_type", "Parking", "daytype", "time_slot", "datatype"]
+if is_wide(stores_df):
+    all_cat_cols = ["store_type", "Parking"]
 label_mapping = {
     0: ["Libero Servizio", "Supermarket", "Discount Store", "Hypermarket", "Drug Store"],
     1: ["No", "Yes"],
@@ -119,61 +145,75 @@ label_mapping = {
     4: ["Under 18", "18-30 yr", "31-40", "41-50", "51-60", "Over 60", "Males", "Females"]
 }
 
-fig, axes = plt.subplots(ncols = 3, nrows= 2, figsize = (10, 10))
-sns.set_theme(style="ticks")
-for i,ax in enumerate(axes.flat):
-    if i < len(all_cat_cols):
-        sns.countplot(x = all_cat_cols[i], data=stores_df , ax = ax, edgecolor = "#446CAD", color = "#84ACC8")
-        plt.xlabel(all_cat_cols[i])
-        plt.ylabel("")
-        if i in label_mapping:
-            ax.set_xticklabels(label_mapping[i], rotation = 45)
-    else:
-        # If there are fewer columns than subplots, remove the empty subplots
-        fig.delaxes(ax) 
-plt.tight_layout()
-plt.show()
+def plot_countplots(stores_df, all_cat_cols, label_mapping):
+    fig, axes = plt.subplots(ncols = 3, nrows= 2, figsize = (10, 10))
+    sns.set_theme(style="ticks")
+    for i,ax in enumerate(axes.flat):
+        if i < len(all_cat_cols):
+            sns.countplot(x = all_cat_cols[i], data=stores_df , ax = ax, edgecolor = "#446CAD", color = "#84ACC8")
+            plt.xlabel(all_cat_cols[i])
+            plt.ylabel("")
+            if i in label_mapping:
+                ax.set_xticklabels(label_mapping[i], rotation = 45)
+        else:
+            # If there are fewer columns than subplots, remove the empty subplots
+            fig.delaxes(ax) 
+    plt.tight_layout()
+
+show("2_countplots", plot_countplots, stores_df[all_cat_cols], all_cat_cols, label_mapping)
 
 # Plot histograms for all the numerical features for univariate analysis
 print("Generating the Histograms.\n")
 all_num_cols = ["store_size", "population", "population_m", "population_f", "population_age_00_04_yr", "population_age_05_14_yr", 
         "population_age_15_34_yr", "population_age_35_44_yr", "population_age_45_54_yr", "population_age_55_64_yr", "population_age_65_up_yr", 
         "annual_average", "potential"]
-stores_df.hist(column = all_num_cols)
+if is_wide(stores_df):
+    all_num_cols.remove("annual_average")
+def plot_histograms(stores_df, all_num_cols):
+    stores_df.hist(column = all_num_cols)
+
+    plt.ylabel("")
+    plt.tick_params(axis='y', which='both', left=False, right=False, labelleft=False)
+    plt.tight_layout()
 
-plt.ylabel("")
-plt.tick_params(axis='y', which='both', left=False, right=False, labelleft=False)
-plt.tight_layout()
-plt.show()
+show("2_histograms", plot_histograms, stores_df[all_num_cols], all_num_cols)
 
 # Plot scatter plots for all the numerical features for bivariate analysis
 print("Generating the scatter plots.\n")
-fig, axes = plt.subplots(ncols = 5, nrows= 3, figsize = (10, 10))
-sns.set_theme(style="ticks")
-for i,ax in enumerate(axes.flat):
-    if i < len(all_num_cols):
-        sns.scatterplot(data = stores_df, x = all_num_cols[i], y = "potential", ax = ax, edgecolor = "#446CAD", color = "#84ACC8")
-    else:
-        # If there are fewer columns than subplots, remove the empty subplots
-        fig.delaxes(ax) 
-plt.tight_layout()
-plt.show()
+def plot_scatterplots(stores_df, all_num_cols):
+    fig, axes = plt.subplots(ncols = 5, nrows= 3, figsize = (10, 10))
+    sns.set_theme(style="ticks")
+    for i,ax in enumerate(axes.flat):
+        if i < len(all_num_cols):
+            sns.scatterplot(data = stores_df, x = all_num_cols[i], y = "potential", ax = ax, edgecolor = "#446CAD", color = "#84ACC8")
+        else:
+            # If there are fewer columns than subplots, remove the empty subplots
+            fig.delaxes(ax) 
+    plt.tight_layout()
+
+show("2_scatterplots", plot_scatterplots, stores_df[all_num_cols], all_num_cols)
 
 # Plot box plots for all the categorical features for bivariate analysis
 print("Generating the box plots.\n")
-fig, axes = plt.subplots(ncols = 3, nrows= 2, figsize = (10, 10))
-sns.set_theme(style="ticks")
-for i, ax in enumerate(axes.flat):
-    if i < len(all_cat_cols):
-        sns.boxplot(data=stores_df, x=all_cat_cols[i], y="potential", ax=ax, color="#84ACC8")
-        if i in label_mapping:
-            ax.set_xticklabels(label_mapping[i], rotation=45)
-    else:
-        # If there are fewer columns than subplots, remove the empty subplots
-        fig.delaxes(ax)
-plt.tight_layout()
-plt.show()
-
-# Create a new csv file called 2_stores_preprocessed.csv for further processing and analysis.
-stores_df.to_csv("2_stores_preprocessed.csv", index = False)
-print("Dataframe has been saved in a new csv file called: 2_stores_preprocessed.csv.")
\ No newline at end of file
+def plot_boxplots(stores_df, all_cat_cols, label_mapping):
+    fig, axes = plt.subplots(ncols = 3, nrows= 2, figsize = (10, 10))
+    sns.set_theme(style="ticks")
+    for i, ax in enumerate(axes.flat):
+        if i < len(all_cat_cols):
+            sns.boxplot(data=stores_df, x=all_cat_cols[i], y="potential", ax=ax, color="#84ACC8")
+            if i in label_mapping:
+                ax.set_xticklabels(label_mapping[i], rotation=45)
+        else:
+            # If there are fewer columns than subplots, remove the empty subplots
+            fig.delaxes(ax)
+    plt.tight_layout()
+
+show("2_boxplots", plot_boxplots, stores_df[all_cat_cols + ["potential"]], all_cat_cols, label_mapping)
+
+# Create a new parquet file called 2_stores_preprocessed.parquet for further processing and analysis.
+with step("write") as s:
+    write_stage(s.record(stores_df), "2_stores_preprocessed")
+print("Dataframe has been saved in a new parquet file called: 2_stores_preprocessed.parquet.")
+
+with step("render"):
+    finish()
\ No newline at end of file
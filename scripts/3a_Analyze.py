@@ -10,68 +10,118 @@ import seaborn as sns
 import matplotlib.pyplot as plt
 import statsmodels.api as sm
 import scipy.stats as stats
-from scipy.stats import kruskal, mannwhitneyu
 import matplotlib.colors as mcolors
+from gravitation_features import is_wide
+from correlation_engine import correlate, clustered, vif_selection
+from onehot_encoder import fit_vocabulary, save_vocabulary, encode
+from nonparametric_tests import store_level, run_tests
+from stage_io import read_stage, write_stage
+from report import show, finish
+from instrument import step, verbose
+
+# Store-level categorical features tested against potential, the subgroups they are also tested within and the number
+# of label permutations behind the permutation p-values
+TEST_FEATURES = ["store_type", "Parking", "Comune"]
+TEST_SUBGROUPS = ["Comune"]
+PERMUTATIONS = 9999
+# Population and gravitation features are dropped while their variance inflation factor exceeds the threshold, except
+# the kept ones
+VIF_THRESHOLD = 10
+VIF_KEEP = ["population_m", "population_f"]
 
 # Load the datasets in dataframes
-stores_df = pd.read_csv("2_stores_preprocessed.csv")
+with step("load") as s:
+    stores_df = s.record(read_stage("2_stores_preprocessed"))
 potential_column = stores_df["potential"]
 
 # Explore the initial rows, data types and dimensions of the dataset
-print("Displaying the initial rows, data types and dimensions of the dataset.\n")
-print(stores_df.head(), stores_df.info(), stores_df.shape)
-print(stores_df.dtypes)
+if verbose():
+    print("Displaying the initial rows, data types and dimensions of the dataset.\n")
+    print(stores_df.head(), stores_df.info(), stores_df.shape)
+    print(stores_df.dtypes)
 
 # Encode the relvant categorical features using One-Hot Encoding
 columns_to_encode = ["store_type", "daytype", "time_slot", "datatype"]
-encoded_df = pd.get_dummies(stores_df[columns_to_encode], columns = columns_to_encode)
-encoded_df = pd.concat([potential_column, encoded_df], axis = 1)
+if is_wide(stores_df):
+    columns_to_encode = ["store_type"]
+# The categories and column order are saved, so that prediction inputs are encoded into exactly the same columns.
+# The one-hot columns are kept sparse, every row sets only one column per feature.
+with step("encode") as s:
+    vocabulary = fit_vocabulary(stores_df, columns_to_encode)
+    save_vocabulary(vocabulary)
+    encoded_df = s.record(encode(stores_df[columns_to_encode], vocabulary))
 
 # Explore the initial rows, data types and dimensions of the encoded datasets
-print("\nDisplaying the initial rows, data types and dimensions of the encoded dataset.\n")
-print(encoded_df.head(), encoded_df.info(), encoded_df.shape)
-print(encoded_df.dtypes)
+if verbose():
+    print("\nDisplaying the initial rows, data types and dimensions of the encoded dataset.\n")
+    print(encoded_df.head(), encoded_df.info(), encoded_df.shape)
+    print(encoded_df.dtypes)
 
 all_num_cols = ["store_size", "Parking", "population_m", "population_f", "population_age_00_04_yr", "population_age_05_14_yr", 
         "population_age_15_34_yr", "population_age_35_44_yr", "population_age_45_54_yr", "population_age_55_64_yr", "population_age_65_up_yr",
          "annual_average", "potential"]
+if is_wide(stores_df):
+    all_num_cols.remove("annual_average")
 
 # Perform descriptive statistics
-print(stores_df[all_num_cols].describe())
+if verbose():
+    print(stores_df[all_num_cols].describe())
 
 cmap = mcolors.LinearSegmentedColormap.from_list('custom_blue', ['#FFFFFF', '#84ACC8'])
 
 # Display heatmap of the linear correlation between numerical predictors and the response variable potential
-corr_matrix = round(stores_df[all_num_cols].corr(), 2)
-sns.set_theme(style = "ticks")
-sns.heatmap(corr_matrix, annot = True, cmap = cmap, linewidths = 0.5)
-plt.show()
-
-# Drop population related features to reduce multi-collinearity keeping population_m and population_p only
-stores_df.drop(["population", "population_age_00_04_yr", "population_age_05_14_yr", 
-        "population_age_15_34_yr", "population_age_35_44_yr", "population_age_45_54_yr", "population_age_55_64_yr", "population_age_65_up_yr"], axis = 1, inplace = True)
-
-# Test to check if the observed differences in potential values between store types and parking are statistically significant.
-statistic, p_value = kruskal(stores_df["potential"][stores_df["store_type"] == "IPR"],
-                        stores_df["potential"][stores_df["store_type"] == "SUP"],
-                        stores_df["potential"][stores_df["store_type"] == "LIS"],
-                        stores_df["potential"][stores_df["store_type"] == "SSD"],
-                        stores_df["potential"][stores_df["store_type"] == "DIS"])
-
-print(f"\np-value for Kruskal-Wallis test: {p_value:.3f}")
-
-statistic, p_value = mannwhitneyu(stores_df["potential"][stores_df["Parking"] == 1],
-                        stores_df["potential"][stores_df["Parking"] == 0])
-
-print(f"\np_value for Mann-Whitney U test: {p_value:.3f}")
+def plot_heatmap(corr_matrix, cmap):
+    sns.set_theme(style = "ticks")
+    sns.heatmap(corr_matrix, annot = len(corr_matrix) <= 20, cmap = cmap, linewidths = 0.5)
+
+# The correlations are accumulated over chunks of the dataframe, with strongly correlated features placed together.
+# Only the population block is a candidate for the multi-collinearity selection below, the other model inputs (store
+# size, parking, the gravitation columns in long and wide layout, competitor features) and the tested features are
+# never dropped.
+selection_cols = [col for col in stores_df.columns if col.startswith("population")]
+with step("correlation"):
+    corr_all = correlate(stores_df, list(dict.fromkeys(all_num_cols + selection_cols)))
+corr_matrix = round(clustered(corr_all.loc[all_num_cols, all_num_cols]), 2)
+show("3a_heatmap", plot_heatmap, corr_matrix, cmap)
+
+if verbose():
+    print("\nSpearman correlation with potential:")
+    print(correlate(stores_df, all_num_cols, method = "spearman")["potential"].sort_values())
+
+# Drop the features with the largest variance inflation factor until none exceeds VIF_THRESHOLD to reduce
+# multi-collinearity, population_m and population_f are always kept
+vif_report = vif_selection(corr_all.loc[selection_cols, selection_cols], threshold = VIF_THRESHOLD, keep = VIF_KEEP)
+dropped_cols = vif_report.loc[vif_report["dropped"], "feature"].tolist()
+if verbose():
+    print(vif_report.to_string())
+print(f"\nFeatures dropped for multi-collinearity: {dropped_cols}")
+stores_df.drop(dropped_cols, axis = 1, inplace = True)
+
+# Test if the differences in potential between the levels of the store-level categorical features are statistically
+# significant, over all stores and within every Comune. Every store is tested once, not once per gravitation record.
+with step("tests") as s:
+    store_tests = s.record(run_tests(store_level(stores_df, TEST_FEATURES + ["potential"]), "potential", TEST_FEATURES,
+                                     by = TEST_SUBGROUPS, n_permutations = PERMUTATIONS))
+overall = store_tests[store_tests["by"] == "All"].set_index("feature")
+
+print(f"\np-value for Kruskal-Wallis test: {overall.loc['store_type', 'kruskal_p']:.3f}")
+print(f"\np_value for Mann-Whitney U test: {overall.loc['Parking', 'mannwhitney_p']:.3f}")
+if verbose():
+    print(store_tests.to_string())
 
 # Combine numerical features with the encoded categorical features.
-stores_df.drop(["store_ID", "store_type", "Comune", "microcode", "daytype", "time_slot", "datatype", "Point", "potential"], axis = 1, inplace = True)
-stores_df = pd.concat([stores_df, encoded_df], axis=1)           
-print(stores_df.info())
-
-# Create a new csv file called 3_stores_encoded.csv for further processing and analysis.
-stores_df.to_csv("3_stores_encoded.csv", index = False)
-print("Dataframe has been saved in a new csv file called: 3_stores_encoded.csv.\n")
-
-
+# store_ID is kept so that cross-validation can group the rows of each store, it is not used as a feature
+stores_df.drop(["store_type", "Comune", "microcode", "daytype", "time_slot", "datatype", "Point", "potential"], axis = 1, inplace = True, errors = "ignore")
+# The one-hot columns stay sparse, write_stage stores them as dense booleans one slice of rows at a time and the
+# models are fit on the CSR design matrix built from them
+stores_df = pd.concat([stores_df, potential_column, encoded_df], axis=1)
+if verbose():
+    print(stores_df.info())
+
+# Create a new parquet file called 3_stores_encoded.parquet for further processing and analysis.
+with step("write") as s:
+    write_stage(s.record(stores_df), "3_stores_encoded")
+print("Dataframe has been saved in a new parquet file called: 3_stores_encoded.parquet.\n")
+
+with step("render"):
+    finish()
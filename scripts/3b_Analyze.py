@@ -9,92 +9,112 @@ import numpy as np
 import seaborn as sns
 import matplotlib.pyplot as plt
 import geopandas as gpd
-from shapely.wkt import loads
+from gravitation_features import is_wide, melt_gravitation
+from stage_io import read_stage
+from aggregation_cube import build_cube, categorize, save_cube
+from report import show, finish
+from instrument import step, verbose
+
+# Columns the cube needs besides the gravitation keys
+CUBE_COLUMNS = ["store_type", "store_size", "Parking", "potential", "microcode"]
 
 # Load the datasets in dataframes
-stores_df = pd.read_csv("2_stores_preprocessed.csv")
+with step("load") as s:
+    stores_df = s.record(read_stage("2_stores_preprocessed"))
 
 # Explore the initial rows, data types and dimensions of the dataset
-print("Displaying the initial rows, data types and dimensions of the dataset.\n")
-print(stores_df.head(), stores_df.info(), stores_df.shape)
-print(stores_df.dtypes)
+if verbose():
+    print("Displaying the initial rows, data types and dimensions of the dataset.\n")
+    print(stores_df.head(), stores_df.info(), stores_df.shape)
+    print(stores_df.dtypes)
+
+# Bring wide gravitation columns back to daytype, time_slot and datatype rows for the gravitation analyses
+with step("melt") as s:
+    gravitation_df = s.record(melt_gravitation(stores_df, id_vars = ["store_ID"] + CUBE_COLUMNS) if is_wide(stores_df) else stores_df)
+
+# Count the rows and sum potential and annual_average once per store type, size, parking, potential, daytype, time slot,
+# datatype and microcode combination, the contingency tables and means below are rollups of this cube
+with step("cube") as s:
+    cube = build_cube(pd.concat([gravitation_df, categorize(gravitation_df)], axis = 1))
+    s.record(cube.codes)
+    save_cube(cube)
 
 # Create contingency table for potential with respect to store type, store size and parking
-pot_categories = ["Low (0.001 - 0.241)", "Medium (0.241 - 0.601)", "High (0.601 - 0.841)"]
-size_categories = ["Small (100 - 1000)", "Medium (1000 - 5000)", "Large (5000 - 12701)"]
-
-stores_df["potential_cat"] = pd.cut(stores_df["potential"], bins = [0.001, 0.241, 0.601, 0.841], labels = pot_categories, include_lowest = True)
-stores_df["size_cat"] = pd.cut(stores_df["store_size"], bins = [100, 1000, 5000, 12701], labels = size_categories, include_lowest = True)
-
-ct_store_type = pd.crosstab(stores_df["store_type"], stores_df["potential_cat"], margins = True, margins_name = "Total")
-ct_size = pd.crosstab(stores_df["size_cat"], stores_df["potential_cat"], margins = True, margins_name = "Total")
-ct_parking = pd.crosstab(stores_df["Parking"], stores_df["potential_cat"], margins = True, margins_name = "Total")
+ct_store_type = cube.crosstab("store_type", "potential_cat", margins = True, margins_name = "Total")
+ct_size = cube.crosstab("size_cat", "potential_cat", margins = True, margins_name = "Total")
+ct_parking = cube.crosstab("Parking", "potential_cat", margins = True, margins_name = "Total")
 
 print("\nContingency Table of Potential and Store Type:", ct_store_type)
 print("\nContingency Table of Potential and Store Size:", ct_size)
 print("\nContingency Table of Potential and Parking", ct_parking)
 
 # Perform geo-spatial analysis on the yearly average population gravation across stores
-stores_df['geometry'] = stores_df['Point'].apply(lambda x: loads(x))
-gdf = gpd.GeoDataFrame(stores_df, geometry='geometry')
+with step("merge") as s:
+    stores_df['geometry'] = stores_df['Point']
+    gdf = gpd.GeoDataFrame(stores_df, geometry='geometry')
 
-store_avg = stores_df.groupby("store_ID")["annual_average"].mean()
-gdf = gdf.merge(store_avg, left_on='store_ID', right_index=True, how='left', suffixes=('', '_avg'))
+    store_avg = gravitation_df.groupby("store_ID")["annual_average"].mean()
+    gdf = gdf.merge(store_avg, left_on='store_ID', right_index=True, how='left', suffixes=('', '_avg'))
 
-# Perform geo-spatial analysis on the potential across stores
-store_pot = stores_df.groupby("store_ID")["potential"].mean()
-gdf = gdf.merge(store_avg, left_on='store_ID', right_index=True, how='left', suffixes=('', '_pot'))
+    # Perform geo-spatial analysis on the potential across stores
+    store_pot = stores_df.groupby("store_ID")["potential"].mean()
+    gdf = s.record(gdf.merge(store_avg, left_on='store_ID', right_index=True, how='left', suffixes=('', '_pot')))
 
-fig, ax = plt.subplots(1, 1, figsize=(12, 10))
-sns.set_theme(style="ticks")
+def plot_potential_map(gdf):
+    fig, ax = plt.subplots(1, 1, figsize=(12, 10))
+    sns.set_theme(style="ticks")
 
-gdf.plot(column="potential", cmap="Blues", linewidth=0.8, edgecolor="0.8", legend=True, legend_kwds={"shrink": 0.4}, ax=ax)
-ax.set_title("Average potential across stores")
-ax.set_xticklabels("")
-ax.set_yticklabels("")
-ax.tick_params(axis="x", which="both", bottom=False, top=False)
-ax.tick_params(axis="y", which="both", left=False, right=False)
+    gdf.plot(column="potential", cmap="Blues", linewidth=0.8, edgecolor="0.8", legend=True, legend_kwds={"shrink": 0.4}, ax=ax)
+    ax.set_title("Average potential across stores")
+    ax.set_xticklabels("")
+    ax.set_yticklabels("")
+    ax.tick_params(axis="x", which="both", bottom=False, top=False)
+    ax.tick_params(axis="y", which="both", left=False, right=False)
 
-plt.show()
+show("3b_potential_map", plot_potential_map, gdf[["geometry", "potential"]])
 
 # Display top 10 stores with the most yearly average population movement
 store_pot.sort_values(ascending = False, inplace = True)
 print(store_pot.head(10))
-print(store_pot.describe())
+if verbose():
+    print(store_pot.describe())
 
 # Perform the analyses on store_type, day_type, time_slot, and demographics with respect to yearly average population gravitation
-daytype_avg = stores_df.groupby("daytype")["annual_average"].mean()
-time_slot_avg = stores_df.groupby("time_slot")["annual_average"].mean()
-datatype_avg = stores_df.groupby("datatype")["annual_average"].mean()
-
-fig, axes = plt.subplots(1, 3, figsize = (12, 10))
-sns.set_theme(style = "ticks")
-
-# Plot Daytype Analysis
-sns.barplot(x=daytype_avg.index, y=daytype_avg.values, ax=axes[0], edgecolor = "#446CAD", color = "#84ACC8")
-axes[0].set_xlabel('Daytype')
-axes[0].set_title('Day Type Analysis')
-axes[0].set_yticklabels("")
-axes[0].tick_params(axis = "y", which = "both", left =False, right = False)
-axes[0].set_xticklabels(["Weekday", "Weekend"])
-
-# Plot Time Slot Analysis
-sns.barplot(x=time_slot_avg.index, y=time_slot_avg.values, ax=axes[1], edgecolor = "#446CAD", color = "#84ACC8")
-axes[1].set_xlabel('Time Slot')
-axes[1].set_title('Temporal Analysis')
-axes[1].set_yticklabels("")
-axes[1].tick_params(axis = "y", which = "both", left =False, right = False)
-axes[1].set_xticklabels(["07am - 10am", "10am - 13pm", "13pm - 14pm", "14pm - 17pm", "17pm - 20pm"])
-
-# Plot Demographic Insights
-sns.barplot(x=datatype_avg.index, y=datatype_avg.values, ax=axes[2], edgecolor = "#446CAD", color = "#84ACC8")
-axes[2].set_xlabel('Age Group and Gender')
-axes[2].set_title('Demographic Trend Analysis')
-axes[2].set_yticklabels("")
-axes[2].tick_params(axis = "y", which = "both", left =False, right = False)
-axes[2].set_xticklabels(["Under 18", "18 - 30", "31 - 40", "41 - 50", "51 - 60", "Over 61", "Females", "Males"])
-
-plt.tight_layout(pad = 2.0)
-plt.show()
-
-stores_df.drop(["potential_cat", "size_cat"], axis = 1, inplace = True)
\ No newline at end of file
+daytype_avg = cube.mean(["daytype"], "annual_average")
+time_slot_avg = cube.mean(["time_slot"], "annual_average")
+datatype_avg = cube.mean(["datatype"], "annual_average")
+
+def plot_gravitation_bars(daytype_avg, time_slot_avg, datatype_avg):
+    fig, axes = plt.subplots(1, 3, figsize = (12, 10))
+    sns.set_theme(style = "ticks")
+
+    # Plot Daytype Analysis
+    sns.barplot(x=daytype_avg.index, y=daytype_avg.values, ax=axes[0], edgecolor = "#446CAD", color = "#84ACC8")
+    axes[0].set_xlabel('Daytype')
+    axes[0].set_title('Day Type Analysis')
+    axes[0].set_yticklabels("")
+    axes[0].tick_params(axis = "y", which = "both", left =False, right = False)
+    axes[0].set_xticklabels(["Weekday", "Weekend"])
+
+    # Plot Time Slot Analysis
+    sns.barplot(x=time_slot_avg.index, y=time_slot_avg.values, ax=axes[1], edgecolor = "#446CAD", color = "#84ACC8")
+    axes[1].set_xlabel('Time Slot')
+    axes[1].set_title('Temporal Analysis')
+    axes[1].set_yticklabels("")
+    axes[1].tick_params(axis = "y", which = "both", left =False, right = False)
+    axes[1].set_xticklabels(["07am - 10am", "10am - 13pm", "13pm - 14pm", "14pm - 17pm", "17pm - 20pm"])
+
+    # Plot Demographic Insights
+    sns.barplot(x=datatype_avg.index, y=datatype_avg.values, ax=axes[2], edgecolor = "#446CAD", color = "#84ACC8")
+    axes[2].set_xlabel('Age Group and Gender')
+    axes[2].set_title('Demographic Trend Analysis')
+    axes[2].set_yticklabels("")
+    axes[2].tick_params(axis = "y", which = "both", left =False, right = False)
+    axes[2].set_xticklabels(["Under 18", "18 - 30", "31 - 40", "41 - 50", "51 - 60", "Over 61", "Females", "Males"])
+
+    plt.tight_layout(pad = 2.0)
+
+show("3b_gravitation_bars", plot_gravitation_bars, daytype_avg, time_slot_avg, datatype_avg)
+
+with step("render"):
+    finish()
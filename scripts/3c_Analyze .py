@@ -9,58 +9,73 @@ import numpy as np
 import seaborn as sns
 import matplotlib.pyplot as plt
 from matplotlib.ticker import PercentFormatter
+from stage_io import read_stage
+from pareto_engine import build_index, top_for_share, binned_curve, save_index
+from report import show, finish
+from instrument import step
 
-# Load the datasets in dataframes
-stores_df = pd.read_csv("2_stores_preprocessed.csv")
-
-store_avg = stores_df.groupby("store_ID")["potential"].mean().sort_values(ascending = False).reset_index()
-store_avg["Cumulative"] = store_avg["potential"].cumsum()
-value_sum = store_avg["Cumulative"].tail(1).values
-store_avg["Cumulative %"] = (store_avg["Cumulative"] / value_sum) * 100
-
-fig, axes = plt.subplots(1, 2, figsize=(18, 8))
-sns.set_theme(style = "ticks")
-
-# Pareto chart for store_type
-sns.barplot(x=store_avg["store_ID"], y=store_avg["potential"],
-            order=store_avg.sort_values('potential', ascending=False)["store_ID"],
-            ax=axes[0], edgecolor="#446CAD", color="#84ACC8")
-
-axes[0].set_xticklabels("")
-axes[0].tick_params(axis="x", which="both", bottom=False, top=False)
-
-axes1_id = axes[0].twinx()
-axes1_id.plot(store_avg.index, store_avg["Cumulative %"], color="red")
-axes1_id.yaxis.set_major_formatter(PercentFormatter())
-
-axes[0].set_title('Pareto Chart for store_ID')
+PARETO_DIMENSIONS = ["store_ID", "store_type", "Comune", "microcode"]
+# Curves with more entities than this are drawn as bins of consecutive ranks
+PLOT_BINS = 200
+# Charts with at most this many entities (store_type, Comune) keep their category labels, larger ones hide them
+MAX_LABELLED = 30
 
-# Pareto chart for store_type
-store_avg_type = stores_df.groupby("store_type")["potential"].mean().sort_values(ascending=False).reset_index()
-store_avg_type["Cumulative"] = store_avg_type["potential"].cumsum()
-value_sum_type = store_avg_type["Cumulative"].tail(1).values
-store_avg_type["Cumulative %"] = (store_avg_type["Cumulative"] / value_sum_type) * 100
-
-sns.barplot(x=store_avg_type["store_type"], y=store_avg_type["potential"],
-            order=store_avg_type.sort_values('potential', ascending=False)["store_type"],
-            ax=axes[1], edgecolor="#446CAD", color="#84ACC8")
-axes[1].tick_params(axis="x", which="both", bottom=False, top=False)
-
-axes1_type = axes[1].twinx()
-axes1_type.plot(store_avg_type.index, store_avg_type["Cumulative %"], color="red")
-axes1_type.yaxis.set_major_formatter(PercentFormatter())
-
-axes[1].set_title('Pareto Chart for store_type')
-
-plt.tight_layout(pad=2.0)
-plt.show()
+# Load the datasets in dataframes
+with step("load") as s:
+    stores_df = s.record(read_stage("2_stores_preprocessed", columns = PARETO_DIMENSIONS + ["potential"]))
+
+# Sort the entities of every dimension by mean potential once, with their cumulative share, and save the indexes
+with step("pareto index"):
+    pareto_indexes = {dimension: build_index(stores_df, dimension) for dimension in PARETO_DIMENSIONS}
+    for dimension, index in pareto_indexes.items():
+        save_index(index, dimension)
+
+# Pareto charts from the binned curves, one bar per bin of ranks instead of one bar per store
+def plot_pareto_charts(curves):
+    fig, axes = plt.subplots(2, 2, figsize=(18, 12))
+    sns.set_theme(style = "ticks")
+
+    for ax, (dimension, curve) in zip(axes.flat, curves.items()):
+        ax.bar(np.arange(len(curve)), curve["potential"], width=1.0, edgecolor="#446CAD", color="#84ACC8")
+        if "label" in curve:
+            ax.set_xticks(np.arange(len(curve)), curve["label"], rotation = 45 if len(curve) > 10 else 0)
+        else:
+            ax.set_xticklabels("")
+        ax.tick_params(axis="x", which="both", bottom=False, top=False)
+
+        ax_cumulative = ax.twinx()
+        ax_cumulative.plot(np.arange(len(curve)), curve["Cumulative %"], color="red")
+        ax_cumulative.yaxis.set_major_formatter(PercentFormatter())
+
+        ax.set_title(f"Pareto Chart for {dimension}")
+
+    plt.tight_layout(pad=2.0)
+
+def pareto_curve(dimension, index):
+    curve = binned_curve(index, bins = PLOT_BINS)
+    # Small dimensions are not binned, every bar is one entity
+    if len(index) <= MAX_LABELLED:
+        curve["label"] = index[dimension].astype(str).to_numpy()
+    return curve
+
+curves = {dimension: pareto_curve(dimension, index) for dimension, index in pareto_indexes.items()}
+show("3c_pareto_charts", plot_pareto_charts, curves)
+
+# Number of entities of every dimension that generate 80% of the combined potential, by binary search on the index
+for dimension, index in pareto_indexes.items():
+    k = top_for_share(index, 80)
+    print(f"{dimension}: {k} out of {len(index)} generate 80% of the combined potential.")
 
 # Display 20% of unique stores that generate 80% of combined potential
-top_20_percent_stores = store_avg[store_avg["Cumulative %"] <= 80]
+store_avg = pareto_indexes["store_ID"]
+top_20_percent_stores = store_avg.iloc[:top_for_share(store_avg, 80)]
 print(top_20_percent_stores)
 
 print(f"\n{top_20_percent_stores.shape[0]} out of {store_avg.shape[0]} stores generate 80% of the combined potential.")
 
 # Create a new csv file called 4_top_20_percent_stores.csv for record purpose only.
 top_20_percent_stores.to_csv("4_top_20_percent_stores.csv", index = False)
-print("\nList of top 20 percent stores has been saved in a new csv file called: 4_top_20_percent_stores.csv.")
\ No newline at end of file
+print("\nList of top 20 percent stores has been saved in a new csv file called: 4_top_20_percent_stores.csv.")
+
+with step("render"):
+    finish()
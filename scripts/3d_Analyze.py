@@ -8,21 +8,36 @@ import pandas as pd
 import numpy as np
 import seaborn as sns
 import matplotlib.pyplot as plt
-from sklearn.model_selection import train_test_split
-from sklearn.model_selection import cross_val_score, KFold, GridSearchCV
 from sklearn.tree import DecisionTreeRegressor
 from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor, AdaBoostRegressor
+from stage_io import read_stage, write_stage, stage_path
+from artifacts import get_split
+from model_search import search
+from cv_engine import grouped_folds
+from onehot_encoder import load_vocabulary, design_matrix
+from instrument import step
+
+# Successive halving drops weak candidates after fitting them on part of each training fold. It is faster than the
+# exhaustive grid search but may select different hyperparameters, so it is off by default.
+HALVING = False
 
 # Load the datasets in dataframes
-stores_df = pd.read_csv("3_stores_encoded.csv")
+with step("load") as s:
+    stores_df = s.record(read_stage("3_stores_encoded"))
 
-X = stores_df.drop("potential", axis = 1)
+X = stores_df.drop(["potential", "store_ID"], axis = 1)
 y = stores_df["potential"]
 
-X_train, X_holdout, y_train, y_holdout = train_test_split(X, y, test_size = 0.2, random_state = 42)
+# Reuse the train/holdout split stored for this version of the encoded dataset, the rows of a store stay on one side
+split_key, train_idx, holdout_idx = get_split(stage_path("3_stores_encoded"), stores_df["store_ID"], test_size = 0.2, random_state = 42)
+X_holdout, y_train, y_holdout = X.iloc[holdout_idx], y.iloc[train_idx], y.iloc[holdout_idx]
 
 holdout_set = pd.concat([X_holdout, y_holdout], axis = 1)
-holdout_set.to_csv("5_holdout_set.csv", index = False)
+write_stage(holdout_set, "5_holdout_set")
+
+# The models are fit on a dense float32 array of the numeric and one-hot columns
+X_design, feature_names = design_matrix(X, load_vocabulary())
+X_train = X_design[train_idx]
 
 print("Initiating")
 
@@ -61,11 +76,15 @@ models_params = {
 
 '''A good standard value for k in k-fold cross-validation is 10, as empirical evidence shows. Experiments by Ron Kohavi on various real-world dataset
 suggest that 10-fold cross-validation offers the best tradeoff between bias and variance'''
-kf = KFold(n_splits = 10, shuffle = True, random_state = 42)
+# The folds are grouped by store_ID, so the rows of one store are never on both sides of a split
+folds = grouped_folds(stores_df["store_ID"].iloc[train_idx], n_splits = 10, random_state = 42)
 
+# Candidates x folds are evaluated on all cores, and scores already in .search_cache.joblib are not recomputed.
 for model_name, (model, param_grid) in models_params.items():
-    grid_search = GridSearchCV(model, param_grid = param_grid, cv = kf, scoring = "neg_mean_squared_error")
-    grid_search.fit(X_train, y_train)
+    with step(f"fit {model_name.rstrip(':')}") as s:
+        grid_search = search(model, param_grid, X_train, y_train, cv = folds, scoring = "neg_mean_squared_error", halving = HALVING)
+        s.record(X_train)
     
-    # Print the best hyperparameters
-    print(f"Best Hyperparameters for {model_name}:", grid_search.best_params_)
\ No newline at end of file
+    # Print the best hyperparameters and the fit time of every candidate
+    print(f"Best Hyperparameters for {model_name}:", grid_search["best_params"])
+    print(grid_search["results"][["round", "share", "params", "mean_score", "mean_fit_time"]].to_string(index = False))
\ No newline at end of file
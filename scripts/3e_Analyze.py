@@ -11,11 +11,17 @@ import matplotlib.pyplot as plt
 from sklearn.model_selection import cross_val_score, KFold
 from sklearn.tree import DecisionTreeRegressor
 from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor, AdaBoostRegressor
+from stage_io import read_stage
+from cv_engine import grouped_folds, cross_validate_models
+from onehot_encoder import load_vocabulary, design_matrix
+from instrument import step
 
 # Load the datasets in dataframes
-stores_df = pd.read_csv("3_stores_encoded.csv")
+with step("load") as s:
+    stores_df = s.record(read_stage("3_stores_encoded"))
 
-X = stores_df.drop("potential", axis = 1)
+# The models are fit on a dense float32 array of the numeric and one-hot columns
+X, feature_names = design_matrix(stores_df.drop(["potential", "store_ID"], axis = 1), load_vocabulary())
 y = stores_df["potential"]
 
 dt = DecisionTreeRegressor(max_depth = None, random_state = 42)
@@ -23,19 +29,24 @@ fr = RandomForestRegressor(n_estimators = 100, max_depth = None, random_state =
 gb = GradientBoostingRegressor(n_estimators = 100, max_depth = 5, learning_rate = 0.1, random_state = 42)
 ab = AdaBoostRegressor(n_estimators = 100, learning_rate = 0.01, random_state = 42)
 
-ensemble_regressors = [dt, fr, gb, ab]
+ensemble_regressors = {"DecisionTree": dt, "RandomForest": fr, "GradientBoosting": gb, "AdaBoost": ab}
 
 '''A good standard value for k in k-fold cross-validation is 10, as empirical evidence shows. Experiments by Ron Kohavi on various real-world dataset
 suggest that 10-fold cross-validation offers the best tradeoff between bias and variance'''
-kf = KFold(n_splits = 10, shuffle = True, random_state = 42)
+# The rows of a store are kept in the same fold, so its gravitation copies never sit on both sides of a split
+folds = grouped_folds(stores_df["store_ID"], n_splits = 10, random_state = 42)
 
-for regressor in ensemble_regressors:
-    score = cross_val_score(estimator = regressor, X = X, y = y, cv = kf, scoring = "neg_mean_squared_error")
-    rmse_score = (-score) ** 0.5
+# All regressors x folds are evaluated in one parallel pool
+with step("fit") as s:
+    cv_results = s.record(cross_validate_models(ensemble_regressors, X, y, folds))
+
+for regressor, scores in cv_results.groupby("model", sort = False):
+    rmse_score = scores["rmse"].to_numpy()
     mean_rmse = np.mean(rmse_score)
     std_rmse = np.std(rmse_score)
 
-    print(f"Root Mean Squared Error of {regressor} is {rmse_score}")
+    print(f"Root Mean Squared Error of {ensemble_regressors[regressor]} is {rmse_score}")
     print(f"Mean RMSE: {mean_rmse}")
     print(f"Standard Deviation of RMSE: {std_rmse}")
+    print(f"Mean fit time: {scores['fit_time'].mean():.3f}s, mean predict time: {scores['predict_time'].mean():.3f}s")
     print("\n")
@@ -11,21 +11,31 @@ import seaborn as sns
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
-import joblib
+from stage_io import read_stage, stage_path
+from artifacts import get_split, save_model
+from onehot_encoder import load_vocabulary, design_matrix
+from report import show, finish
+from instrument import step
 
 # Load the datasets in dataframes
-stores_df = pd.read_csv("3_stores_encoded.csv")
+with step("load") as s:
+    stores_df = s.record(read_stage("3_stores_encoded"))
 
-X = stores_df.drop("potential", axis = 1)
+# The forest is fit on a dense float32 array of the numeric and one-hot columns
+X, feature_names = design_matrix(stores_df.drop(["potential", "store_ID"], axis = 1), load_vocabulary())
 y = stores_df["potential"]
 
-X_train, X_holdout, y_train, y_holdout = train_test_split(X, y, test_size = 0.2, random_state = 42)
+# Reuse the train/holdout split stored for this version of the encoded dataset, the rows of a store stay on one side
+split_key, train_idx, holdout_idx = get_split(stage_path("3_stores_encoded"), stores_df["store_ID"], test_size = 0.2, random_state = 42)
+X_train, X_holdout, y_train, y_holdout = X[train_idx], X[holdout_idx], y.iloc[train_idx], y.iloc[holdout_idx]
 
 random_forest = RandomForestRegressor(n_estimators = 100, max_depth = None, random_state = 42, criterion = "squared_error")
-fater_model = random_forest.fit(X_train, y_train)
+with step("fit") as s:
+    fater_model = random_forest.fit(s.record(X_train), y_train)
 
-y_train_pred = random_forest.predict(X_train)
-y_holdout_pred = random_forest.predict(X_holdout)
+with step("predict") as s:
+    y_train_pred = random_forest.predict(X_train)
+    y_holdout_pred = s.record(random_forest.predict(X_holdout))
 
 # Computing MSE to measure the average of the squared differences between predicted and actual values. It heavily penalizes large erros due to squating opertion. This makes is sensitive to ourliers.
 mse_train = mean_squared_error(y_train, y_train_pred)
@@ -43,7 +53,8 @@ print(f"MSE train: {mse_train:.10f}, holdout {mse_holdout:.10f}")
 print(f"MAE train: {mae_train:.10f}, holdout {mae_holdout:.10f}")
 print(f"r2 train: {r2_train:.10f}, holdout {r2_holdout:.10f}")
 
-n, k = stores_df.shape
+# Degrees of freedom from the rows and the feature columns (store_ID and potential are not predictors)
+n, k = X.shape
 residuals = (((y_holdout - y_holdout_pred) ** 2).sum()) / (n - k - 1)
 standard_error = residuals ** 0.5
 print(f"Standard Error of Predicted Values: {standard_error}")
@@ -51,18 +62,26 @@ print(f"Standard Error of Predicted Values: {standard_error}")
 feature_importances = random_forest.feature_importances_
 
 feature_importance_df = pd.DataFrame({
-    'Feature': X.columns,
+    'Feature': feature_names,
     'Importance': feature_importances
 })
 
 feature_importance_df = feature_importance_df.sort_values(by='Importance', ascending=False)
 
 # Plot feature importances
-plt.figure(figsize=(10, 6))
-plt.barh(feature_importance_df['Feature'], feature_importance_df['Importance'])
-plt.xlabel('Importance')
-plt.title('Feature Importance Analysis')
-plt.show()
-
-joblib.dump(fater_model, "fater_model.joblib")
-print("\nTrained model has been saved as fater_model.joblib for future use.")
\ No newline at end of file
+def plot_feature_importances(feature_importance_df):
+    plt.figure(figsize=(10, 6))
+    plt.barh(feature_importance_df['Feature'], feature_importance_df['Importance'])
+    plt.xlabel('Importance')
+    plt.title('Feature Importance Analysis')
+
+show("3f_feature_importances", plot_feature_importances, feature_importance_df)
+
+# Register the model with its feature column order so that prediction does not need the training data. The registry
+# holds the only pickle of the model next to its compact forest arrays.
+with step("write"):
+    model_key = save_model("fater_model", fater_model, feature_names, split_key)
+print(f"Trained model has been registered as fater_model (artifacts/models/{model_key}).")
+
+with step("render"):
+    finish()
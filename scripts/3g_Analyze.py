@@ -11,27 +11,39 @@ import seaborn as sns
 from sklearn.tree import DecisionTreeRegressor, export_text, export_graphviz
 from sklearn.model_selection import train_test_split
 import graphviz
+from stage_io import read_stage, stage_path
+from artifacts import get_split
+from onehot_encoder import load_vocabulary, design_matrix
+from instrument import step, verbose
 
 # Load the datasets in dataframes
-stores_df = pd.read_csv("3_stores_encoded.csv")
+with step("load") as s:
+    stores_df = s.record(read_stage("3_stores_encoded"))
 
-X = stores_df.drop("potential", axis = 1)
+# The tree is fit on a dense float32 array of the numeric and one-hot columns
+X, feature_names = design_matrix(stores_df.drop(["potential", "store_ID"], axis = 1), load_vocabulary())
 y = stores_df["potential"]
 
-X_train, X_holdout, y_train, y_holdout = train_test_split(X, y, test_size = 0.2, random_state = 42)
+# Reuse the train/holdout split stored for this version of the encoded dataset, the rows of a store stay on one side
+split_key, train_idx, holdout_idx = get_split(stage_path("3_stores_encoded"), stores_df["store_ID"], test_size = 0.2, random_state = 42)
+X_train, X_holdout, y_train, y_holdout = X[train_idx], X[holdout_idx], y.iloc[train_idx], y.iloc[holdout_idx]
 
-model = DecisionTreeRegressor(max_depth = None, random_state = 42)
-model.fit(X, y)
+with step("fit") as s:
+    model = DecisionTreeRegressor(max_depth = None, random_state = 42)
+    model.fit(s.record(X), y)
 
-tree_rules = export_text(model, feature_names = X.columns.tolist())
-print("Decision Tree Rules:\n", tree_rules)
+# The unpruned tree has thousands of rules on large datasets, they are only printed in verbose mode
+if verbose():
+    tree_rules = export_text(model, feature_names = feature_names)
+    print("Decision Tree Rules:\n", tree_rules)
 
 # Visualize the decision tree graphically (requires Graphviz)
-dot_data = export_graphviz(model, out_file = None, 
-                           feature_names = X.columns.tolist(),  
-                           filled = True, rounded = True,  
-                           special_characters = True)  
-
-graph = graphviz.Source(dot_data)
-graph.render("decision_tree")
-graph.view("decision_tree")
\ No newline at end of file
+with step("render"):
+    dot_data = export_graphviz(model, out_file = None, 
+                               feature_names = feature_names,  
+                               filled = True, rounded = True,  
+                               special_characters = True)  
+
+    graph = graphviz.Source(dot_data)
+    graph.render("decision_tree")
+    graph.view("decision_tree")
\ No newline at end of file
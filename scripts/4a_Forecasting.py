@@ -9,41 +9,96 @@ import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.ticker as ticker
 import seaborn as sns
+from istat_loader import aggregate_csv
+from forecast_engine import project_under_five, microcode_projection
+from stage_io import write_stage
+from report import show, finish
+from instrument import step, verbose
 
-df_child = pd.read_csv("ISTAT_Child_Births_Data_2024.csv")
-df_population = pd.read_csv("ISTAT_Population_Data_2024.csv")
+# Provinces to analyse, None aggregates every province. The filter is applied while the files are read.
+PROVINCES = ["Napoli"]
+# ISTAT years to read, None reads them all (the birth trends are fitted on every year)
+YEARS = None
+# Years projected past the last ISTAT year, age group of the diaper-age population and province code of every province
+# in socio_demo_NA.csv
+HORIZON = 5
+UNDER_FIVE_AGE = "0-4"
+# The microcodes of socio_demo carry a province code but no comune, so the projections are spread over the microcodes
+# per province. forecast_engine itself takes any area column, e.g. Comune.
+PROVINCE_CODES = {"Napoli": "NA"}
+# Age groups of the ageing population plot, only these and the diaper-age group are read from the population file
+AGEING_AGES = ["80-84", "85-89", "90-94", "95+"]
 
-print(df_child.info())
-print(df_child.shape)
+def istat_filters(area_column, ages = None):
+    filters = {area_column: PROVINCES} if PROVINCES else {}
+    if YEARS:
+        filters["Year"] = YEARS
+    if ages:
+        filters["Age"] = ages
+    return filters
 
-print(df_population.info())
-print(df_population.shape)
+# The national files are streamed in blocks and summed on the fly, rows of other provinces, years and age groups are
+# dropped while they are read. The aggregates are cached in .istat_cache/
+with step("load") as s:
+    births_by_province = aggregate_csv("ISTAT_Child_Births_Data_2024.csv", "Live births", ["Province", "Year"],
+                                     filters = istat_filters("Province"))
+    population_by_province = s.record(aggregate_csv("ISTAT_Population_Data_2024.csv", "Total", ["Provincia", "Year", "Age"],
+                                                    filters = istat_filters("Provincia", AGEING_AGES + [UNDER_FIVE_AGE])))
 
-df_child = df_child[df_child["Province"] == "Napoli"]
-df_population = df_population[df_population["Provincia"] == "Napoli"]
+if verbose():
+    print(births_by_province.info())
+    print(births_by_province.shape)
 
-df_child_grouped = df_child.groupby("Year").agg({"Live births": "sum"}).reset_index()
-df_population_grouped = df_population.groupby(["Year", "Age"]).agg({"Total": "sum"}).reset_index()
+    print(population_by_province.info())
+    print(population_by_province.shape)
 
-df_95plus = df_population_grouped[df_population_grouped["Age"] == "95+"]
-df_90_94 = df_population_grouped[df_population_grouped["Age"] == "90-94"]
-df_85_89 = df_population_grouped[df_population_grouped["Age"] == "85-89"]
-df_80_84 = df_population_grouped[df_population_grouped["Age"] == "80-84"]
+df_child_grouped = births_by_province.groupby("Year").agg({"Live births": "sum"}).reset_index()
+df_population_grouped = population_by_province.groupby(["Year", "Age"]).agg({"Total": "sum"}).reset_index()
 
-fig, (ax1, ax2) = plt.subplots(1,2, figsize = (12, 10), sharex = True)
-sns.set_theme(style = "ticks")
-sns.lineplot(data = df_child_grouped, x = "Year", y = "Live births", color = "#84ACC8", ax = ax1)
-ax1.set_ylabel("Live Births")
-ax1.set_xlabel("")
-ax1.set_title("Live Births Over the Years")
+df_80_84, df_85_89, df_90_94, df_95plus = (df_population_grouped[df_population_grouped["Age"] == age] for age in AGEING_AGES)
 
-sns.lineplot(data = df_95plus, x = "Year", y = "Total", ax = ax2, label = "95+", color = "black")
-sns.lineplot(data = df_90_94, x = "Year", y = "Total", ax = ax2, label = "90-94", color = "brown")
-sns.lineplot(data = df_85_89, x = "Year", y = "Total", ax = ax2, label = "85-89", color ="darkblue")
-sns.lineplot(data = df_80_84, x = "Year", y = "Total", ax = ax2, label = "80-84", color = "#84ACC8")
-ax2.set_ylabel("Total Population")
-ax2.set_xlabel("")
-ax2.set_title("Ageing Population Over the Years")
+def plot_trends(df_child_grouped, df_95plus, df_90_94, df_85_89, df_80_84):
+    fig, (ax1, ax2) = plt.subplots(1,2, figsize = (12, 10), sharex = True)
+    sns.set_theme(style = "ticks")
+    sns.lineplot(data = df_child_grouped, x = "Year", y = "Live births", color = "#84ACC8", ax = ax1)
+    ax1.set_ylabel("Live Births")
+    ax1.set_xlabel("")
+    ax1.set_title("Live Births Over the Years")
 
-plt.gca().xaxis.set_major_locator(ticker.MaxNLocator(integer = True))
-plt.show()
+    sns.lineplot(data = df_95plus, x = "Year", y = "Total", ax = ax2, label = "95+", color = "black")
+    sns.lineplot(data = df_90_94, x = "Year", y = "Total", ax = ax2, label = "90-94", color = "brown")
+    sns.lineplot(data = df_85_89, x = "Year", y = "Total", ax = ax2, label = "85-89", color ="darkblue")
+    sns.lineplot(data = df_80_84, x = "Year", y = "Total", ax = ax2, label = "80-84", color = "#84ACC8")
+    ax2.set_ylabel("Total Population")
+    ax2.set_xlabel("")
+    ax2.set_title("Ageing Population Over the Years")
+
+    plt.gca().xaxis.set_major_locator(ticker.MaxNLocator(integer = True))
+
+show("4a_trends", plot_trends, df_child_grouped, df_95plus, df_90_94, df_85_89, df_80_84)
+
+# Fit the birth trends of all provinces at once and project the 0-4 year population from the last five birth cohorts
+births = births_by_province.rename(columns = {"Province": "area", "Live births": "value"})
+under_five = population_by_province[population_by_province["Age"] == UNDER_FIVE_AGE]
+under_five = under_five.rename(columns = {"Provincia": "area", "Total": "value"})
+with step("fit") as s:
+    projection = s.record(project_under_five(births, under_five, horizon = HORIZON))
+print(projection[~projection["observed"]])
+
+# Scale the 0-4 year population of every microcode by the projected growth of its province since the latest year with
+# an observed 0-4 population, which can be earlier than the last year of births
+# "NA" is the province code of Naples, not a missing value
+demographics = pd.read_csv("socio_demo_NA.csv", usecols = ["microcode", "province", "population_age_00_04_yr"],
+                           keep_default_na = False, na_values = [""])
+province_names = {code: name for name, code in PROVINCE_CODES.items()}
+microcode_demand = microcode_projection(demographics, demographics["province"].map(province_names).to_numpy(),
+                                        projection)
+print(microcode_demand.head())
+
+# Create a new parquet file called 4_microcode_demand with the projected diaper-age population of every microcode
+with step("write") as s:
+    write_stage(s.record(microcode_demand), "4_microcode_demand")
+print("\nProjected 0-4 year population per microcode has been saved in a new parquet file called: 4_microcode_demand.parquet.")
+
+with step("render"):
+    finish()
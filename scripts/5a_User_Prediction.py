@@ -6,28 +6,29 @@
 # Import relevant packages and modules
 import pandas as pd
 import numpy as np
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
-import joblib
-
-# Load the datasets in dataframes
-stores_df = pd.read_csv("3_stores_encoded.csv")
-
-X = stores_df.drop("potential", axis = 1)
-y = stores_df["potential"]
-
-X_train, X_holdout, y_train, y_holdout = train_test_split(X, y, test_size = 0.2, random_state = 42)
-
-#random_forest = RandomForestRegressor(n_estimators = 100, max_depth = None, random_state = 42, criterion = "squared_error")
-#random_forest.fit(X_train, y_train)
-
-#Load the saved model
-loaded_model = joblib.load("fater_model.joblib")
+from artifacts import load_compiled_model
+from forest_engine import predict
+from onehot_encoder import load_vocabulary, encode
+from competitor_features import add_competitor_features
+from province_ingest import STORE_COLUMNS, input_path
+import imputer
+from instrument import step
+
+#Load the saved model together with the feature column order it was trained with, the training data is not read.
+#The compiled forest is memory-mapped from compact arrays instead of unpickling the sklearn model.
+with step("load"):
+    compiled_model, model_meta = load_compiled_model("fater_model")
 
 # Predict the potential on dummy data
 path = 'dummy.csv'
 dummy_data = pd.read_csv(path)
-dummy_pred = loaded_model.predict(dummy_data)
-print(dummy_pred)
-
+# Candidate stores given by their coordinates get the competitor features of the stores in stores_NA.csv
+dummy_data = add_competitor_features(dummy_data, pd.read_csv(input_path("stores", "NA")).rename(columns = STORE_COLUMNS))
+# Missing inputs are filled with the medians and modes computed in 2_Pre-process.py
+dummy_data = imputer.transform(dummy_data, imputer.load())
+# Raw categorical inputs (store_type, daytype, ...) are one-hot encoded with the categories saved at training time
+dummy_data = encode(dummy_data, load_vocabulary(), sparse_columns = False)
+# The flat forest arrays predict small batches much faster than sklearn's predict
+with step("predict") as s:
+    dummy_pred = predict(compiled_model, s.record(dummy_data[model_meta["feature_columns"]]))
+print(dummy_pred)
\ No newline at end of file
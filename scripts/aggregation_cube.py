@@ -0,0 +1,139 @@
+''' title: "Aggregation cube"
+    author: "Raza Mehar | Najam Mehdi | Pujan Thapa"
+    date: "2026-10-18"
+    description: Counting the rows and summing the measures (potential, annual_average) of the pre-processed data for
+                 every observed combination of store_type, size_cat, Parking, potential_cat, daytype, time_slot,
+                 datatype and microcode in one pass, with integer category codes and bincount. Contingency tables and
+                 group means are then rollups of the cube's cells instead of new scans of the rows. Rows with a
+                 missing value in a dimension are left out of the rollups over that dimension, like crosstab and
+                 groupby do.'''
+
+# Import relevant packages and modules
+import json
+import os
+import numpy as np
+import pandas as pd
+
+CUBE_DIR = os.path.join("artifacts", "cube")
+DIMENSIONS = ["store_type", "size_cat", "Parking", "potential_cat", "daytype", "time_slot", "datatype", "microcode"]
+MEASURES = ["potential", "annual_average"]
+
+POTENTIAL_CATEGORIES = ["Low (0.001 - 0.241)", "Medium (0.241 - 0.601)", "High (0.601 - 0.841)"]
+POTENTIAL_BINS = [0.001, 0.241, 0.601, 0.841]
+SIZE_CATEGORIES = ["Small (100 - 1000)", "Medium (1000 - 5000)", "Large (5000 - 12701)"]
+SIZE_BINS = [100, 1000, 5000, 12701]
+
+
+def categorize(df):
+    '''Return the potential_cat and size_cat columns of the contingency analyses.'''
+    return pd.DataFrame({
+        "potential_cat": pd.cut(df["potential"], bins=POTENTIAL_BINS, labels=POTENTIAL_CATEGORIES, include_lowest=True),
+        "size_cat": pd.cut(df["store_size"], bins=SIZE_BINS, labels=SIZE_CATEGORIES, include_lowest=True)},
+        index=df.index)
+
+
+def _codes(values):
+    '''Integer codes (-1 for missing) and labels of a column, in category order or sorted order.'''
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.cat.codes.to_numpy(), values.cat.categories
+    codes, labels = pd.factorize(values, sort=True)
+    return codes, labels
+
+
+class Cube:
+    '''Cells of the observed dimension combinations with their row count and the sum and count of every measure.'''
+
+    def __init__(self, labels, codes, measures):
+        self.labels = labels
+        self.codes = codes
+        self.measures = measures
+
+    @property
+    def dimensions(self):
+        return list(self.labels)
+
+    def select(self, **selection):
+        '''Sub-cube of the cells whose dimensions have the given labels, e.g. select(store_type=["SUP", "IPR"]).'''
+        keep = np.ones(len(self.codes), dtype=bool)
+        for dim, values in selection.items():
+            values = values if isinstance(values, (list, tuple, set)) else [values]
+            wanted = self.labels[dim].get_indexer(list(values))
+            keep &= np.isin(self.codes[:, self.dimensions.index(dim)], wanted[wanted >= 0])
+        return Cube(self.labels, self.codes[keep], {name: totals[keep] for name, totals in self.measures.items()})
+
+    def _dense(self, dims, measure):
+        '''Totals of a measure and row counts as arrays with one axis per dimension of dims, in label order.'''
+        positions = [self.dimensions.index(dim) for dim in dims]
+        codes = self.codes[:, positions]
+        keep = (codes >= 0).all(axis=1)
+        shape = [len(self.labels[dim]) for dim in dims]
+        keys = np.ravel_multi_index(tuple(codes[keep].T), shape)
+        size = int(np.prod(shape))
+        totals = np.bincount(keys, weights=self.measures[measure][keep], minlength=size).reshape(shape)
+        counts = np.bincount(keys, weights=self.measures["count"][keep], minlength=size).reshape(shape)
+        return totals, counts
+
+    def rollup(self, dims, measure="count"):
+        '''Total of a measure ("count", "<value>_sum" or "<value>_n") per observed combination of dims.'''
+        totals, counts = self._dense(dims, measure)
+        observed = np.nonzero(counts)
+        if len(dims) == 1:
+            index = pd.Index(self.labels[dims[0]][observed[0]], name=dims[0])
+        else:
+            index = pd.MultiIndex.from_arrays([self.labels[dim][c] for dim, c in zip(dims, observed)], names=dims)
+        return pd.Series(totals[observed], index=index, name=measure)
+
+    def mean(self, dims, value):
+        '''Mean of a measure per observed combination of dims, missing values of the measure are skipped.'''
+        mean = self.rollup(dims, f"{value}_sum") / self.rollup(dims, f"{value}_n")
+        return mean.rename(value)
+
+    def crosstab(self, rows, columns, margins=True, margins_name="All"):
+        '''Row counts of rows x columns, laid out like pd.crosstab with the same margins.'''
+        counts = self._dense([rows, columns], "count")[0].astype(np.int64)
+        # Like crosstab, only the labels that occur are shown
+        keep_rows, keep_columns = counts.any(axis=1), counts.any(axis=0)
+        table = pd.DataFrame(counts[keep_rows][:, keep_columns],
+                             index=pd.Index(self.labels[rows][keep_rows], name=rows),
+                             columns=pd.Index(self.labels[columns][keep_columns], name=columns))
+        if margins:
+            table[margins_name] = table.sum(axis=1)
+            table.loc[margins_name] = table.sum(axis=0)
+        return table
+
+
+def build_cube(df, dimensions=DIMENSIONS, measures=MEASURES):
+    '''Aggregate the rows of df into a Cube over the dimensions it has, in a single pass over the rows.'''
+    dimensions = [dim for dim in dimensions if dim in df.columns]
+    codes, labels = zip(*(_codes(df[dim]) for dim in dimensions))
+    # Missing values get their own code 0, so every row has a cell
+    shape = [len(dim_labels) + 1 for dim_labels in labels]
+    keys = np.ravel_multi_index(tuple(np.asarray(c, dtype=np.int64) + 1 for c in codes), shape)
+    cells, inverse = np.unique(keys, return_inverse=True)
+    n_cells = len(cells)
+
+    totals = {"count": np.bincount(inverse, minlength=n_cells).astype(np.float64)}
+    for value in [value for value in measures if value in df.columns]:
+        values = df[value].to_numpy(dtype=np.float64)
+        present = ~np.isnan(values)
+        totals[f"{value}_sum"] = np.bincount(inverse[present], weights=values[present], minlength=n_cells)
+        totals[f"{value}_n"] = np.bincount(inverse[present], minlength=n_cells).astype(np.float64)
+
+    cell_codes = np.stack(np.unravel_index(cells, shape), axis=1) - 1
+    return Cube(dict(zip(dimensions, labels)), cell_codes.astype(np.int32), totals)
+
+
+def save_cube(cube, directory=CUBE_DIR):
+    os.makedirs(directory, exist_ok=True)
+    np.savez(os.path.join(directory, "cells.npz"), codes=cube.codes, **cube.measures)
+    labels = {dim: {"dtype": str(values.dtype), "values": values.tolist()} for dim, values in cube.labels.items()}
+    with open(os.path.join(directory, "labels.json"), "w") as f:
+        json.dump(labels, f, indent=1)
+
+
+def load_cube(directory=CUBE_DIR):
+    with open(os.path.join(directory, "labels.json")) as f:
+        labels = {dim: pd.Index(entry["values"], dtype=entry["dtype"]) for dim, entry in json.load(f).items()}
+    with np.load(os.path.join(directory, "cells.npz")) as cells:
+        measures = {name: cells[name] for name in cells.files if name != "codes"}
+        return Cube(labels, cells["codes"], measures)
@@ -0,0 +1,113 @@
+''' title: "Model and dataset artifact registry"
+    author: "Raza Mehar | Najam Mehdi | Pujan Thapa"
+    date: "2026-10-18"
+    description: Storing the train/holdout split, the feature column order and the fitted models under keys derived
+                 from a fingerprint of the encoded dataset and the hyperparameters, so that 3d, 3f, 3g and 5a share
+                 them instead of recomputing them, and prediction only loads the model it needs. Random forests are
+                 also stored in the compact, memory-mappable format of forest_engine.'''
+
+# Import relevant packages and modules
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import joblib
+import numpy as np
+from forest_engine import compile_forest, save_compiled, load_compiled
+
+ARTIFACTS_DIR = "artifacts"
+
+
+def dataset_fingerprint(path):
+    '''Hash the content of a dataset file.'''
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def artifact_key(*parts, **params):
+    '''Derive a short key from fingerprints and hyperparameters.'''
+    payload = json.dumps([parts, params], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def get_split(dataset_path, groups, test_size=0.2, random_state=42):
+    '''Return (split key, train row positions, holdout row positions) for a dataset, computing the split only once.
+
+    groups holds the group (store) of every row, all the rows of a group are on the same side of the split like in
+    the grouped cross-validation folds. test_size is the share of groups held out.'''
+    key = artifact_key(dataset_fingerprint(dataset_path), test_size=test_size, random_state=random_state, grouped=True)
+    path = os.path.join(ARTIFACTS_DIR, "splits", f"{key}.npz")
+    if os.path.exists(path):
+        split = np.load(path)
+        return key, split["train"], split["holdout"]
+
+    # Imported here so that prediction, which never splits, does not pay for importing sklearn
+    from sklearn.model_selection import GroupShuffleSplit
+    groups = np.asarray(groups)
+    train, holdout = next(GroupShuffleSplit(n_splits=1, test_size=test_size, random_state=random_state)
+                          .split(np.zeros(len(groups)), groups=groups))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Stages running in parallel (3d, 3f, 3g) ask for the same split, the file only appears once it is complete
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".npz")
+    with os.fdopen(fd, "wb") as f:
+        np.savez(f, train=train, holdout=holdout)
+    os.replace(tmp, path)
+    return key, train, holdout
+
+
+def is_averaging_forest(model):
+    '''Tell whether a model predicts the plain mean of its trees over all features, the only kind forest_engine
+    compiles. AdaBoost (weighted median) and bagging over feature subsets are served from the pickle.'''
+    # Imported here so that prediction, which never saves models, does not pay for importing sklearn
+    from sklearn.ensemble import ExtraTreesRegressor, RandomForestRegressor
+    return isinstance(model, (RandomForestRegressor, ExtraTreesRegressor))
+
+
+def save_model(name, model, feature_columns, split_key):
+    '''Store a fitted model with its feature column order and mark it as the latest model called name.
+
+    model.joblib in the model's folder is the only pickle of the model, it is kept for models without a compiled form
+    and for comparing the compiled forest with sklearn. Prediction of forests only maps the compact arrays.'''
+    key = artifact_key(split_key, type(model).__name__, **model.get_params())
+    directory = os.path.join(ARTIFACTS_DIR, "models", key)
+    os.makedirs(directory, exist_ok=True)
+    joblib.dump(model, os.path.join(directory, "model.joblib"))
+    if is_averaging_forest(model):
+        save_compiled(compile_forest(model), os.path.join(directory, "forest"))
+    elif os.path.isdir(os.path.join(directory, "forest")):
+        # Arrays compiled for this model by an earlier version would otherwise be served instead of the pickle
+        shutil.rmtree(os.path.join(directory, "forest"))
+    with open(os.path.join(directory, "meta.json"), "w") as f:
+        json.dump({"name": name, "model": type(model).__name__, "split": split_key,
+                   "feature_columns": list(feature_columns), "params": model.get_params()}, f, indent=1, default=str)
+
+    os.makedirs(os.path.join(ARTIFACTS_DIR, "latest"), exist_ok=True)
+    with open(os.path.join(ARTIFACTS_DIR, "latest", f"{name}.json"), "w") as f:
+        json.dump({"model": key}, f)
+    return key
+
+
+def model_dir(name):
+    '''Return the folder of the latest model called name.'''
+    with open(os.path.join(ARTIFACTS_DIR, "latest", f"{name}.json")) as f:
+        return os.path.join(ARTIFACTS_DIR, "models", json.load(f)["model"])
+
+
+def load_meta(name):
+    '''Return the metadata (feature column order, parameters, split) of the latest model called name.'''
+    with open(os.path.join(model_dir(name), "meta.json")) as f:
+        return json.load(f)
+
+
+def load_model(name):
+    '''Return the latest fitted model called name together with its metadata.'''
+    return joblib.load(os.path.join(model_dir(name), "model.joblib")), load_meta(name)
+
+
+def load_compiled_model(name):
+    '''Return the memory-mapped compiled forest of the latest model called name together with its metadata.'''
+    return load_compiled(os.path.join(model_dir(name), "forest")), load_meta(name)
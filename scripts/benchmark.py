@@ -0,0 +1,221 @@
+''' title: "Synthetic-data benchmarks of the pipeline stages"
+    author: "Raza Mehar | Najam Mehdi | Pujan Thapa"
+    date: "2026-10-18"
+    description: Generating stores, shapes, socio-demographic and gravitation inputs with the schemas of the real
+                 files at configurable sizes, running the core of every stage on them (geo-join, merge, imputation,
+                 encoding, cross-validation, forest fit, prediction, Pareto) and recording wall time and peak
+                 Python memory per stage and size. Results are appended to a JSON-lines file together with the
+                 git revision, and every run is compared with the last run of another revision.
+
+    usage: python benchmark.py [--sizes N ...] [--grid G] [--stages NAME ...] [--results PATH]'''
+
+# Import relevant packages and modules
+import argparse
+import json
+import os
+import subprocess
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+import shapely
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_PATH = "benchmark_results.jsonl"
+STAGES = ["load", "geo_join", "merge", "imputation", "encoding", "cv", "forest_fit", "predict", "pareto"]
+STORE_TYPES = ["IPR", "SUP", "LIS", "SSD", "DIS"]
+DATATYPES = ["age_u18", "age_18_30", "age_31_40", "age_41_50", "age_51_60", "age_o60", "female", "male"]
+AGE_GROUPS = ["00_04", "05_14", "15_34", "35_44", "45_54", "55_64", "65_up"]
+
+
+def generate(directory, n_stores, grid=20, province="NA", seed=0):
+    '''Write stores_<province>.csv, shapes_, socio_demo_ and gravitation_ inputs to directory.
+
+    The microcodes are a grid x grid lattice of square polygons around Naples, every microcode has a full set of
+    gravitation records (2 day types x 5 time slots x 8 demographics) except the last 5%, and a few population
+    values are missing, like in the real files.'''
+    rng = np.random.default_rng(seed)
+    xs, ys = np.linspace(14.0, 14.6, grid + 1), np.linspace(40.7, 41.0, grid + 1)
+    i, j = np.meshgrid(np.arange(grid), np.arange(grid), indexing="ij")
+    i, j = i.ravel(), j.ravel()
+    microcodes = 15063 * 10 ** 6 + i * 1000 + j
+    polygons = shapely.box(xs[i], ys[j], xs[i + 1], ys[j + 1])
+    pd.DataFrame({"microcode": microcodes, "geometry": shapely.to_wkt(polygons)}).to_csv(
+        os.path.join(directory, f"shapes_{province}.csv"))
+
+    pd.DataFrame({
+        "Cod3HD": np.arange(n_stores) + 1000,
+        "Insegna": rng.choice(["Conad", "Coop", "Lidl", "Carrefour"], n_stores),
+        "TipologiaPdV": rng.choice(STORE_TYPES, n_stores),
+        "MQVEND": rng.integers(100, 12701, n_stores),
+        "Indirizzo": "Via Roma",
+        "Comune": rng.choice(["Napoli", "Pozzuoli", "Portici", "Ercolano", "Casoria"], n_stores),
+        "Provincia": province,
+        "Lat": rng.uniform(40.69, 41.0, n_stores),
+        "Long": rng.uniform(14.0, 14.61, n_stores),
+        "Parking": rng.integers(0, 2, n_stores),
+        "Potenziale": rng.uniform(0.001, 0.841, n_stores),
+    }).to_csv(os.path.join(directory, f"stores_{province}.csv"))
+
+    n = len(microcodes)
+    demographics = pd.DataFrame({"microcode": microcodes, "region": "Campania", "province": province, "district": "x",
+                                 "population": rng.integers(100, 2000, n).astype(float),
+                                 "population_m": rng.integers(50, 1000, n), "population_f": rng.integers(50, 1000, n)})
+    for age in AGE_GROUPS:
+        demographics[f"population_age_{age}_yr"] = rng.integers(0, 300, n).astype(float)
+    demographics.loc[rng.choice(n, max(1, n // 40), replace=False), "population"] = np.nan
+    demographics.to_csv(os.path.join(directory, f"socio_demo_{province}.csv"), index=False)
+
+    with_gravitation = microcodes[:int(n * 0.95)]
+    keys = pd.MultiIndex.from_product([with_gravitation, [0, 1], [1, 2, 3, 4, 5], DATATYPES],
+                                      names=["microcode", "daytype", "fasciaoraria", "datatype"]).to_frame(index=False)
+    keys["media_annuale"] = rng.uniform(0, 50, len(keys))
+    keys.to_csv(os.path.join(directory, f"gravitation_{province}.csv"), index=False)
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=SCRIPTS_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, seconds, peak / 2 ** 20
+
+
+def run_stages(directory, stages=STAGES, province="NA"):
+    '''Run the stages on the inputs in directory and return {stage: (seconds, peak MB, rows)}.
+
+    Stages that are not selected still run when a selected stage needs their output, but are not reported.'''
+    from sklearn.ensemble import RandomForestRegressor
+    from cv_engine import grouped_folds, cross_validate_models
+    from forest_engine import compile_forest, predict
+    from geo_utils import store_points, assign_microcodes
+    from geometry_cache import read_csv_with_geometry
+    from onehot_encoder import fit_vocabulary, encode, design_matrix
+    from pareto_engine import build_index, top_for_share
+    from province_ingest import build_stores, input_path
+    import imputer
+
+    path = lambda kind: input_path(kind, province, directory)
+    data = {}
+
+    def load():
+        data["inputs"] = (pd.read_csv(path("stores")), read_csv_with_geometry(path("shapes"), "geometry",
+                          cache_dir=os.path.join(directory, ".geometry_cache")),
+                          pd.read_csv(path("socio_demo")), pd.read_csv(path("gravitation")))
+        return len(data["inputs"][0])
+
+    def geo_join():
+        stores, shapes = data["inputs"][:2]
+        return int(assign_microcodes(store_points(stores), shapes["geometry"], shapes["microcode"]).notna().sum())
+
+    def merge():
+        data["stage1"] = build_stores(*data["inputs"])
+        return len(data["stage1"])
+
+    num_cols = ["population", "population_m", "population_f"] + [f"population_age_{age}_yr" for age in AGE_GROUPS] + ["annual_average"]
+    cat_cols = ["microcode", "daytype", "time_slot", "datatype"]
+
+    def imputation():
+        df = data["stage1"].astype({"microcode": "object", "daytype": "object", "time_slot": "object"})
+        data["stage2"] = imputer.transform(df, imputer.fit(df, num_cols, cat_cols))
+        return len(data["stage2"])
+
+    def encoding():
+        columns = ["store_type", "daytype", "time_slot", "datatype"]
+        data["vocabulary"] = fit_vocabulary(data["stage2"], columns)
+        encoded = encode(data["stage2"][columns], data["vocabulary"])
+        features = data["stage2"][["store_ID", "store_size", "Parking", "population_m", "population_f", "annual_average", "potential"]]
+        data["stage3"] = pd.concat([features, encoded], axis=1)
+        return len(data["stage3"])
+
+    def split():
+        X = design_matrix(data["stage3"].drop(["potential", "store_ID"], axis=1), data["vocabulary"])[0]
+        return X, data["stage3"]["potential"]
+
+    def cv():
+        X, y = split()
+        folds = grouped_folds(data["stage3"]["store_ID"], n_splits=5, cache_dir=os.path.join(directory, ".cv_folds"))
+        cross_validate_models({"random_forest": RandomForestRegressor(n_estimators=20, random_state=42)}, X, y, folds)
+        return X.shape[0]
+
+    def forest_fit():
+        X, y = split()
+        data["forest"] = RandomForestRegressor(n_estimators=100, n_jobs=-1, random_state=42).fit(X, y)
+        return X.shape[0]
+
+    def predict_stage():
+        X, _ = split()
+        predict(compile_forest(data["forest"]), X[:1000])
+        return min(X.shape[0], 1000)
+
+    def pareto():
+        return top_for_share(build_index(data["stage2"], "store_ID"), 80)
+
+    steps = {"load": load, "geo_join": geo_join, "merge": merge, "imputation": imputation, "encoding": encoding,
+             "cv": cv, "forest_fit": forest_fit, "predict": predict_stage, "pareto": pareto}
+    needs = {"geo_join": ["load"], "merge": ["load"], "imputation": ["merge"], "encoding": ["imputation"],
+             "cv": ["encoding"], "forest_fit": ["encoding"], "predict": ["forest_fit"], "pareto": ["imputation"]}
+
+    results, done = {}, set()
+
+    def run(stage, report):
+        for need in needs.get(stage, []):
+            if need not in done:
+                run(need, False)
+        rows, seconds, peak = _measure(steps[stage])
+        done.add(stage)
+        if report:
+            results[stage] = (seconds, peak, rows)
+
+    for stage in [stage for stage in STAGES if stage in stages]:
+        run(stage, True)
+    return results
+
+
+def load_results(path):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main(sizes, grid, stages, results_path):
+    revision = git_revision()
+    previous = load_results(results_path)
+    # Last recorded run of another revision for every (stage, size)
+    baseline = {(row["stage"], row["n_stores"]): row for row in previous if row["revision"] != revision}
+
+    print(f"{'stores':>7} {'stage':<11} {'seconds':>9} {'peak MB':>9} {'rows':>9} {'vs base':>8}")
+    with open(results_path, "a") as out:
+        for n_stores in sizes:
+            with tempfile.TemporaryDirectory() as directory:
+                generate(directory, n_stores, grid)
+                results = run_stages(directory, stages)
+            for stage, (seconds, peak, rows) in results.items():
+                row = {"revision": revision, "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "n_stores": n_stores,
+                       "grid": grid, "stage": stage, "seconds": seconds, "peak_mb": peak, "rows": rows}
+                out.write(json.dumps(row) + "\n")
+                base = baseline.get((stage, n_stores))
+                ratio = f"{seconds / base['seconds']:.2f}x" if base and base["seconds"] else "-"
+                print(f"{n_stores:>7} {stage:<11} {seconds:>9.3f} {peak:>9.1f} {rows:>9} {ratio:>8}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on synthetic data.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[300, 1000], help="numbers of stores")
+    parser.add_argument("--grid", type=int, default=20, help="microcodes per side of the polygon lattice")
+    parser.add_argument("--stages", nargs="+", default=STAGES, choices=STAGES)
+    parser.add_argument("--results", default=RESULTS_PATH, help="JSON-lines file the results are appended to")
+    args = parser.parse_args()
+    main(args.sizes, args.grid, args.stages, args.results)
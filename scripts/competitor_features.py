@@ -0,0 +1,133 @@
+''' title: "Competitor density features"
+    author: "Raza Mehar | Najam Mehdi | Pujan Thapa"
+    date: "2026-10-18"
+    description: Counting, for every store, the competing stores of every store type within several radii and summing
+                 their sales areas, and measuring the distance to the nearest hypermarket. The coordinates are turned
+                 into metres on the earth's sphere and put in a KD-tree; all the pairs of stores closer than the
+                 largest radius come out of one query and are reduced with bincount, so there is no loop over
+                 stores.'''
+
+# Import relevant packages and modules
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+EARTH_RADIUS_M = 6_371_008.8
+RADII_M = [500, 1000, 2000]
+STORE_TYPES = ["DIS", "IPR", "LIS", "SSD", "SUP"]
+HYPERMARKET_TYPE = "IPR"
+
+
+def to_metres(lat, lon):
+    '''Earth-centred x, y, z coordinates in metres of latitudes and longitudes in degrees.'''
+    lat, lon = np.radians(np.asarray(lat, dtype=np.float64)), np.radians(np.asarray(lon, dtype=np.float64))
+    return EARTH_RADIUS_M * np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+def _chord(distance):
+    '''Straight-line distance through the earth between two points distance metres apart on its surface.'''
+    return 2 * EARTH_RADIUS_M * np.sin(np.asarray(distance, dtype=np.float64) / (2 * EARTH_RADIUS_M))
+
+
+def _arc(chord):
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.minimum(np.asarray(chord) / (2 * EARTH_RADIUS_M), 1.0))
+
+
+def feature_columns(radii=RADII_M, store_types=STORE_TYPES):
+    columns = []
+    for radius in radii:
+        columns.append(f"competitors_{radius}m")
+        for store_type in store_types:
+            columns += [f"competitors_{store_type}_{radius}m", f"competitor_size_{store_type}_{radius}m"]
+    return columns + ["nearest_hypermarket_m"]
+
+
+def competitor_columns(df):
+    '''Return the competitor feature columns of a dataframe, in order.'''
+    return [col for col in feature_columns() if col in df.columns]
+
+
+def competitor_features(stores, competitors=None, radii=RADII_M, store_types=STORE_TYPES,
+                        lat_col="Lat", lon_col="Long", type_col="store_type", size_col="store_size", id_col="store_ID"):
+    '''Competitor features of every row of stores, indexed like stores.
+
+    competitors is the set of stores counted around each store, all of stores by default; a store never counts
+    itself (rows with the same id_col). Stores of types outside store_types only count in competitors_<radius>m.
+    Stores without coordinates get missing values.'''
+    competitors = stores if competitors is None else competitors
+    located = stores[[lat_col, lon_col]].notna().all(axis=1).to_numpy()
+    others = competitors[competitors[[lat_col, lon_col]].notna().all(axis=1)]
+    if not located.any() or others.empty:
+        return pd.DataFrame(np.nan, index=stores.index, columns=feature_columns(radii, store_types))
+
+    points = to_metres(stores.loc[located, lat_col], stores.loc[located, lon_col])
+    other_points = to_metres(others[lat_col], others[lon_col])
+    store_ids, other_ids = stores.loc[located, id_col].to_numpy(), others[id_col].to_numpy()
+    type_codes = pd.Categorical(others[type_col], categories=store_types).codes.astype(np.int64)
+    sizes = others[size_col].to_numpy(dtype=np.float64)
+
+    # Every (store, competitor) pair within the largest radius, from one query between the two trees
+    pairs = cKDTree(points).sparse_distance_matrix(cKDTree(other_points), _chord(max(radii)), output_type="ndarray")
+    rows, cols, chords = pairs["i"], pairs["j"], pairs["v"]
+    other = store_ids[rows] != other_ids[cols]
+    rows, cols, distances = rows[other], cols[other], _arc(chords[other])
+
+    n, k = len(points), len(store_types)
+    typed = type_codes[cols] >= 0
+    values = {}
+    for radius in radii:
+        near = distances <= radius
+        values[f"competitors_{radius}m"] = np.bincount(rows[near], minlength=n)
+        near &= typed
+        keys = rows[near] * k + type_codes[cols[near]]
+        counts = np.bincount(keys, minlength=n * k).reshape(n, k)
+        size_sums = np.bincount(keys, weights=sizes[cols[near]], minlength=n * k).reshape(n, k)
+        for t, store_type in enumerate(store_types):
+            values[f"competitors_{store_type}_{radius}m"] = counts[:, t]
+            values[f"competitor_size_{store_type}_{radius}m"] = size_sums[:, t]
+
+    # Nearest hypermarket other than the store itself, two neighbours are enough to skip the store
+    hypermarkets = (others[type_col] == HYPERMARKET_TYPE).to_numpy()
+    values["nearest_hypermarket_m"] = np.full(n, np.nan)
+    if hypermarkets.any():
+        chords, index = cKDTree(other_points[hypermarkets]).query(points, k=[1, 2])
+        own = other_ids[hypermarkets][index[:, 0]] == store_ids
+        chosen = np.where(own, chords[:, 1], chords[:, 0])
+        values["nearest_hypermarket_m"] = np.where(np.isinf(chosen), np.nan, _arc(chosen))
+
+    located_features = pd.DataFrame(values, index=stores.index[located])[feature_columns(radii, store_types)]
+    return located_features.reindex(stores.index)
+
+
+def add_competitor_features(inputs, competitors, lat_col="Lat", lon_col="Long", id_col="store_ID"):
+    '''Return prediction inputs with their competitor features, counted against the stored stores in competitors.
+
+    Inputs that already have every feature column, or have no coordinates, are returned unchanged. Inputs without
+    id_col are candidate stores that are not among competitors yet, so no stored store is left out for them.'''
+    columns = feature_columns()
+    if all(col in inputs.columns for col in columns) or lat_col not in inputs.columns or lon_col not in inputs.columns:
+        return inputs
+    stores = inputs if id_col in inputs.columns else inputs.assign(**{id_col: None})
+    features = competitor_features(stores, competitors, lat_col=lat_col, lon_col=lon_col, id_col=id_col)
+    return pd.concat([inputs.drop(columns=[col for col in columns if col in inputs.columns]), features], axis=1)
+
+
+def stores_near(stores, points, radius=max(RADII_M), lat_col="Lat", lon_col="Long", id_col="store_ID"):
+    '''Return the ids of the stores within radius metres of any of the (lat, lon) points.'''
+    located = stores[[lat_col, lon_col]].notna().all(axis=1)
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if not located.any() or not len(points):
+        return set()
+    tree = cKDTree(to_metres(stores.loc[located, lat_col], stores.loc[located, lon_col]))
+    pairs = tree.sparse_distance_matrix(cKDTree(to_metres(points[:, 0], points[:, 1])), _chord(radius),
+                                        output_type="ndarray")
+    return set(stores.loc[located, id_col].to_numpy()[pairs["i"]])
+
+
+def within(lat, lon, limits, points):
+    '''Mask of the locations that are at most their limit (metres) away from the nearest of the (lat, lon) points.'''
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if not len(points):
+        return np.zeros(len(lat), dtype=bool)
+    chords = cKDTree(to_metres(points[:, 0], points[:, 1])).query(to_metres(lat, lon))[0]
+    return _arc(chords) <= np.asarray(limits, dtype=np.float64)
@@ -0,0 +1,162 @@
+''' title: "Chunked correlation engine"
+    author: "Raza Mehar | Najam Mehdi | Pujan Thapa"
+    date: "2026-10-18"
+    description: Computing Pearson and Spearman correlation matrices of many numerical columns from a stream of chunks,
+                 by accumulating the pairwise sufficient statistics (counts, sums, sums of squares and cross products
+                 over the rows where both columns are present). Spearman correlations are the Pearson correlations of
+                 mid-ranks, taken from value counts collected in a first pass. Also ordering the matrix by
+                 hierarchical clustering and selecting columns by their variance inflation factor (VIF).'''
+
+# Import relevant packages and modules
+import warnings
+import numpy as np
+import pandas as pd
+from scipy.cluster.hierarchy import leaves_list, linkage
+from scipy.spatial.distance import squareform
+from stage_io import iter_stage
+
+# Added to the diagonal before inverting the correlation matrix, exactly collinear columns then get a VIF of about
+# 1 / RIDGE instead of making the matrix singular
+RIDGE = 1e-8
+
+
+def _chunks(source, columns, chunksize):
+    '''Float64 blocks of the columns of a dataframe, or of a stage output read batch by batch.'''
+    if isinstance(source, pd.DataFrame):
+        for start in range(0, len(source), chunksize):
+            yield source[columns].iloc[start:start + chunksize].to_numpy(dtype=np.float64)
+    else:
+        for batch in iter_stage(source, columns, chunksize):
+            yield batch[columns].to_numpy(dtype=np.float64)
+
+
+def _rank_tables(blocks, n_columns):
+    '''Sorted distinct values and mid-ranks of every column, missing values left out.'''
+    values = [np.empty(0)] * n_columns
+    counts = [np.empty(0, dtype=np.int64)] * n_columns
+    for block in blocks:
+        for j in range(n_columns):
+            column = block[:, j]
+            merged, inverse = np.unique(np.concatenate([values[j], column[~np.isnan(column)]]), return_inverse=True)
+            weights = np.concatenate([counts[j], np.ones(len(inverse) - len(counts[j]), dtype=np.int64)])
+            values[j], counts[j] = merged, np.bincount(inverse, weights=weights).astype(np.int64)
+    return [(v, np.cumsum(c) - (c - 1) / 2) for v, c in zip(values, counts)]
+
+
+def _to_ranks(block, tables):
+    ranks = np.full(block.shape, np.nan)
+    for j, (values, midranks) in enumerate(tables):
+        present = ~np.isnan(block[:, j])
+        ranks[present, j] = midranks[np.searchsorted(values, block[present, j])]
+    return ranks
+
+
+def _pairwise_pearson(blocks):
+    '''Pearson correlations over the pairwise complete rows, accumulated block by block.'''
+    shift = n = sx = sxx = sxy = None
+    for block in blocks:
+        if shift is None:
+            # Shifting by a typical value of every column keeps the sums of squares accurate
+            with warnings.catch_warnings():
+                # Columns without values in the first block are not shifted
+                warnings.simplefilter("ignore", RuntimeWarning)
+                shift = np.nan_to_num(np.nanmedian(block, axis=0)) if len(block) else np.zeros(block.shape[1])
+            p = block.shape[1]
+            n, sx, sxx, sxy = (np.zeros((p, p)) for _ in range(4))
+        present = ~np.isnan(block)
+        x = np.where(present, block - shift, 0.0)
+        sxy += x.T @ x
+        if present.all():
+            # Without missing values every pair has all the rows of the block
+            n += len(block)
+            sx += x.sum(axis=0)[:, None]
+            sxx += (x * x).sum(axis=0)[:, None]
+            continue
+        mask = present.astype(np.float64)
+        n += mask.T @ mask
+        # sx[i, j] is the sum of column i over the rows where column j is present
+        sx += x.T @ mask
+        sxx += (x * x).T @ mask
+    if n is None:
+        return None
+    with np.errstate(invalid="ignore", divide="ignore"):
+        covariance = n * sxy - sx * sx.T
+        variance = n * sxx - sx * sx
+        return covariance / np.sqrt(variance * variance.T)
+
+
+def correlate(source, columns, method="pearson", chunksize=100_000):
+    '''Correlation matrix of the columns of a dataframe or stage output, read in chunks of chunksize rows.
+
+    method is "pearson" or "spearman". Missing values are handled pairwise like DataFrame.corr; for Spearman every
+    column is ranked over all its present values.'''
+    if method == "pearson":
+        blocks = _chunks(source, columns, chunksize)
+    elif method == "spearman":
+        tables = _rank_tables(_chunks(source, columns, chunksize), len(columns))
+        blocks = (_to_ranks(block, tables) for block in _chunks(source, columns, chunksize))
+    else:
+        raise ValueError(f"Unknown correlation method: {method}")
+    matrix = _pairwise_pearson(blocks)
+    if matrix is None:
+        matrix = np.full((len(columns), len(columns)), np.nan)
+    np.fill_diagonal(matrix, 1.0)
+    return pd.DataFrame(matrix, index=columns, columns=columns)
+
+
+def clustered(corr, method="average"):
+    '''Reorder the matrix so that columns with strong (positive or negative) correlations sit next to each other.'''
+    if len(corr) < 3:
+        return corr
+    distance = (1 - corr.abs()).fillna(1).clip(lower=0).to_numpy(copy=True)
+    np.fill_diagonal(distance, 0)
+    order = leaves_list(linkage(squareform(distance, checks=False), method=method))
+    return corr.iloc[order, order]
+
+
+def _nearest_psd(corr):
+    '''Closest positive semi-definite matrix with a unit diagonal, by clipping the negative eigenvalues.
+
+    Correlations over pairwise complete rows do not always form a valid correlation matrix, its inverse would then
+    give negative VIFs.'''
+    matrix = np.nan_to_num(corr)
+    matrix = (matrix + matrix.T) / 2
+    np.fill_diagonal(matrix, 1.0)
+    eigenvalues, eigenvectors = np.linalg.eigh(matrix)
+    matrix = (eigenvectors * np.clip(eigenvalues, 0, None)) @ eigenvectors.T
+    scale = np.sqrt(np.clip(np.diag(matrix), RIDGE, None))
+    return matrix / np.outer(scale, scale)
+
+
+def _vifs(inverse):
+    '''Diagonal of the inverse correlation matrix, negative or non-finite values (numerical noise of an exactly
+    collinear column) count as infinite.'''
+    vif = np.diag(inverse).copy()
+    vif[~np.isfinite(vif) | (vif < 0)] = np.inf
+    return vif
+
+
+def vif_selection(corr, threshold=10.0, keep=()):
+    '''Drop the column with the largest VIF until no VIF exceeds threshold, columns in keep are never dropped.
+
+    The VIFs are the diagonal of the inverse correlation matrix, which is updated after every drop instead of being
+    inverted again. Returns a report with the VIF of every column (at the time it was dropped, or at the end).'''
+    columns = list(corr.columns)
+    inverse = np.linalg.inv(_nearest_psd(corr.to_numpy(dtype=np.float64)) + RIDGE * np.eye(len(columns)))
+    active = list(range(len(columns)))
+    report = {}
+    while active:
+        vif = _vifs(inverse)
+        droppable = [i for i in range(len(active)) if columns[active[i]] not in keep]
+        worst = max(droppable, key=lambda i: vif[i], default=None)
+        if worst is None or vif[worst] <= threshold:
+            break
+        report[columns[active[worst]]] = (vif[worst], True)
+        # Inverse of the matrix without row and column worst, from the current inverse
+        inverse = inverse - np.outer(inverse[:, worst], inverse[worst]) / inverse[worst, worst]
+        inverse = np.delete(np.delete(inverse, worst, axis=0), worst, axis=1)
+        active.pop(worst)
+    vif = _vifs(inverse)
+    for i, a in enumerate(active):
+        report[columns[a]] = (vif[i], False)
+    return pd.DataFrame([(column, *report[column]) for column in columns], columns=["feature", "vif", "dropped"])
@@ -0,0 +1,73 @@
+''' title: "Store-grouped, parallel cross-validation"
+    author: "Raza Mehar | Najam Mehdi | Pujan Thapa"
+    date: "2026-10-18"
+    description: Building k folds once, grouped by store so that the rows of one store never end up on both sides of a
+                 split, caching the fold assignment, and evaluating all regressors x folds in one parallel pool with
+                 RMSE and fit/predict timings.'''
+
+# Import relevant packages and modules
+import os
+import tempfile
+import time
+import joblib
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.metrics import mean_squared_error
+
+FOLDS_DIR = ".cv_folds"
+
+
+def grouped_folds(groups, n_splits=10, random_state=42, cache_dir=FOLDS_DIR):
+    '''Return a list of (train, test) index arrays where every group (store) falls in exactly one test fold.
+
+    Groups are shuffled and dealt round-robin to the folds. The fold number of every row is cached as an int
+    array keyed by the groups and split settings, so repeated runs on the same data reuse it.'''
+    groups = np.asarray(groups)
+    n_groups = len(np.unique(groups))
+    if n_splits > n_groups:
+        raise ValueError(f"Cannot build {n_splits} grouped folds from {n_groups} distinct groups, "
+                         f"every fold needs at least one group.")
+    path = os.path.join(cache_dir, f"{joblib.hash((groups, n_splits, random_state))}.npy")
+    if os.path.exists(path):
+        fold_of_row = np.load(path)
+    else:
+        unique, inverse = np.unique(groups, return_inverse=True)
+        fold_of_group = np.empty(len(unique), dtype=np.int32)
+        fold_of_group[np.random.RandomState(random_state).permutation(len(unique))] = np.arange(len(unique)) % n_splits
+        fold_of_row = fold_of_group[inverse]
+        os.makedirs(cache_dir, exist_ok=True)
+        # Written to a temporary file and moved into place, so parallel stages never read a partial cache
+        fd, tmp = tempfile.mkstemp(dir=cache_dir, suffix=".npy")
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, fold_of_row)
+        os.replace(tmp, path)
+    return [(np.flatnonzero(fold_of_row != fold), np.flatnonzero(fold_of_row == fold)) for fold in range(n_splits)]
+
+
+def take(X, index):
+    '''Rows of a dataframe or of an array at the given positions.'''
+    return X.iloc[index] if hasattr(X, "iloc") else X[index]
+
+
+def _fit_and_evaluate(model, X, y, train_idx, test_idx):
+    estimator = clone(model)
+    start = time.perf_counter()
+    estimator.fit(take(X, train_idx), y.iloc[train_idx])
+    fit_time = time.perf_counter() - start
+    start = time.perf_counter()
+    y_pred = estimator.predict(take(X, test_idx))
+    predict_time = time.perf_counter() - start
+    return mean_squared_error(y.iloc[test_idx], y_pred) ** 0.5, fit_time, predict_time
+
+
+def cross_validate_models(models, X, y, folds, n_jobs=-1):
+    '''Evaluate every model on every fold in one parallel pool, X is a dataframe or a design matrix array.
+
+    Returns one row per model and fold with the RMSE and the fit and predict times in seconds.'''
+    jobs = [(name, fold, delayed(_fit_and_evaluate)(model, X, y, train, test))
+            for name, model in models.items() for fold, (train, test) in enumerate(folds)]
+    results = Parallel(n_jobs=n_jobs)(job for _, _, job in jobs)
+    return pd.DataFrame([{"model": name, "fold": fold, "rmse": rmse, "fit_time": fit_time, "predict_time": predict_time}
+                         for (name, fold, _), (rmse, fit_time, predict_time) in zip(jobs, results)])
@@ -0,0 +1,109 @@
+''' title: "Batched demand forecasting"
+    author: "Raza Mehar | Najam Mehdi | Pujan Thapa"
+    date: "2026-10-18"
+    description: Fitting a trend to the yearly series of many areas (provinces or comuni) at once with closed-form least
+                 squares on an areas x years matrix, projecting live births forward, deriving the 0-4 year (diaper
+                 age) population from the last five birth cohorts and spreading the area projections over the
+                 microcodes of the area.'''
+
+# Import relevant packages and modules
+import numpy as np
+import pandas as pd
+
+COHORT_YEARS = 5
+
+
+def to_matrix(df, area_col, year_col, value_col):
+    '''Pivot a long dataframe into an areas x years matrix, NaN where an area has no value for a year.'''
+    wide = df.pivot_table(index=area_col, columns=year_col, values=value_col, aggfunc="sum", observed=True)
+    return wide.index.to_numpy(), wide.columns.to_numpy(), wide.to_numpy(dtype=float)
+
+
+def fit_trends(years, values, log=False):
+    '''Fit value = intercept + slope * year to every row of an areas x years matrix in one pass, skipping NaNs.
+
+    With log=True the trend is fitted to log(1 + value), i.e. a constant growth rate, which never projects
+    negative counts. Returns a dict with the intercept and slope of every row and the settings of the fit.'''
+    years = np.asarray(years, dtype=float)
+    values = np.log1p(values) if log else np.asarray(values, dtype=float)
+    observed = ~np.isnan(values)
+    # Centring the years keeps the normal equations well conditioned
+    t = np.where(observed, years - years.mean(), 0.0)
+    y = np.where(observed, values, 0.0)
+
+    n = observed.sum(axis=1)
+    sum_t, sum_y = t.sum(axis=1), y.sum(axis=1)
+    denominator = n * (t * t).sum(axis=1) - sum_t ** 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = np.where(denominator > 0, (n * (t * y).sum(axis=1) - sum_t * sum_y) / denominator, 0.0)
+        intercept = np.where(n > 0, (sum_y - slope * sum_t) / n, np.nan)
+    return {"intercept": intercept, "slope": slope, "center": years.mean(), "log": log}
+
+
+def project(trend, years):
+    '''Evaluate fitted trends at the given years, returning an areas x years matrix clipped at zero.'''
+    t = np.asarray(years, dtype=float) - trend["center"]
+    values = trend["intercept"][:, None] + trend["slope"][:, None] * t[None, :]
+    return np.clip(np.expm1(values) if trend["log"] else values, 0, None)
+
+
+def project_under_five(births, under_five, horizon=5, log=True):
+    '''Project live births and the 0-4 year population of every area horizon years past the last observed year.
+
+    births and under_five are long dataframes with the columns area, Year and value. The 0-4 population of a year is
+    the sum of the births of the last five years times a per-area survival ratio (deaths and migration), estimated
+    from the observed years. Returns one row per area and year with births, under_five, whether the births are
+    observed and whether the 0-4 population is observed.'''
+    areas, years, births_matrix = to_matrix(births, "area", "Year", "value")
+    future = np.arange(years.max() + 1, years.max() + 1 + horizon)
+    all_years = np.concatenate([years, future])
+    births_all = np.concatenate([births_matrix, project(fit_trends(years, births_matrix, log=log), future)], axis=1)
+
+    # Births of the last five years for every area and year, NaN until five years are available
+    cumulative = np.nancumsum(births_all, axis=1)
+    cohorts = np.full_like(births_all, np.nan)
+    cohorts[:, COHORT_YEARS - 1:] = cumulative[:, COHORT_YEARS - 1:] - np.pad(cumulative, ((0, 0), (1, 0)))[:, :-COHORT_YEARS]
+
+    observed_under_five = (under_five.pivot_table(index="area", columns="Year", values="value", aggfunc="sum", observed=True)
+                           .reindex(index=areas, columns=all_years).to_numpy(dtype=float))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = np.nanmean(np.where(cohorts > 0, observed_under_five / cohorts, np.nan), axis=1)
+    ratio = np.where(np.isnan(ratio), 1.0, ratio)
+    projected_under_five = np.where(np.isnan(observed_under_five), cohorts * ratio[:, None], observed_under_five)
+
+    return pd.DataFrame({
+        "area": np.repeat(areas, len(all_years)),
+        "Year": np.tile(all_years, len(areas)),
+        "births": births_all.ravel(),
+        "under_five": projected_under_five.ravel(),
+        "observed": np.tile(np.isin(all_years, years), len(areas)),
+        "under_five_observed": ~np.isnan(observed_under_five).ravel(),
+    })
+
+
+def base_years(projection):
+    '''Latest year with an observed 0-4 population of every area.'''
+    return projection[projection["under_five_observed"]].groupby("area")["Year"].max()
+
+
+def microcode_projection(demographics, area_of_microcode, projection, base_year=None):
+    '''Spread area projections over microcodes in proportion to their current 0-4 year population.
+
+    Every microcode's population_age_00_04_yr is scaled by its area's projected 0-4 population relative to
+    base_year, by default the latest year with an observed 0-4 population of the area (the births may be observed
+    for later years). Returns one row per microcode and projected year.'''
+    if base_year is None:
+        base_year = base_years(projection)
+    area_base = (base_year.reindex(projection["area"]).to_numpy(dtype=float) if isinstance(base_year, pd.Series)
+                 else np.full(len(projection), base_year, dtype=float))
+    year = projection["Year"].to_numpy()
+    future = projection[year > area_base]
+    base = projection[year == area_base].set_index("area")["under_five"]
+    growth = future.assign(growth=future["under_five"].to_numpy() / base.reindex(future["area"]).to_numpy())
+
+    microcodes = pd.DataFrame({"microcode": demographics["microcode"].to_numpy(),
+                               "area": area_of_microcode,
+                               "population_age_00_04_yr": demographics["population_age_00_04_yr"].to_numpy()})
+    result = microcodes.merge(growth[["area", "Year", "growth"]], on="area", how="inner")
+    result["projected_age_00_04_yr"] = result["population_age_00_04_yr"] * result["growth"]
+    return result[["microcode", "area", "Year", "population_age_00_04_yr", "projected_age_00_04_yr"]]
@@ -0,0 +1,46 @@
+''' title: "Geo-spatial helpers"
+    author: "Raza Mehar | Najam Mehdi | Pujan Thapa"
+    date: "2026-10-18"
+    description: Point-in-polygon assignment of stores to micro-codes using a single bulk query against an STRtree
+                 spatial index.'''
+
+# Import relevant packages and modules
+import numpy as np
+import pandas as pd
+import shapely
+from shapely import STRtree
+
+
+def store_points(stores, lon_col="Long", lat_col="Lat"):
+    '''Build an array of Shapely Point objects from the longitude and latitude columns in one vectorized call.'''
+    return shapely.points(stores[lon_col].to_numpy(dtype="float64"), stores[lat_col].to_numpy(dtype="float64"))
+
+
+def assign_microcodes(points, polygons, microcodes):
+    '''Return the microcode of the polygon containing each point, or NaN when the point falls outside every polygon.
+
+    Points lying on the boundary count as inside (covered_by), so a store on a border shared by two polygons, or
+    inside overlapping polygons, is matched more than once. In that case the polygon that comes first in the shapes
+    table wins, which matches the first-match rule of the original row-by-row lookup.'''
+    points = np.asarray(points, dtype=object)
+    microcodes = pd.Series(microcodes).reset_index(drop=True)
+
+    tree = STRtree(np.asarray(polygons, dtype=object))
+    point_idx, polygon_idx = tree.query(points, predicate="covered_by")
+
+    # Keep the lowest polygon index for every matched point
+    order = np.lexsort((polygon_idx, point_idx))
+    point_idx, polygon_idx = point_idx[order], polygon_idx[order]
+    matched, first = np.unique(point_idx, return_index=True)
+
+    assigned = pd.Series(microcodes.to_numpy()[polygon_idx[first]], index=matched)
+    return assigned.reindex(range(len(points)))
+
+
+def report_unmatched(stores, microcode_col="microcode", id_col="store_ID"):
+    '''Print how many stores could not be assigned to any polygon and return their identifiers.'''
+    unmatched = stores.loc[stores[microcode_col].isna(), id_col]
+    print(f"{len(unmatched)} out of {len(stores)} stores are not inside any polygon.")
+    if len(unmatched) > 0:
+        print("Unmatched store IDs:", unmatched.tolist())
+    return unmatched
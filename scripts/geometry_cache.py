@@ -0,0 +1,77 @@
+''' title: "Binary geometry cache"
+    author: "Raza Mehar | Najam Mehdi | Pujan Thapa"
+    date: "2026-10-18"
+    description: Parsing WKT geometry columns once with vectorized decoding and caching the result as coordinate arrays
+                 that later runs memory-map instead of parsing the text again.'''
+
+# Import relevant packages and modules
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+import shapely
+
+CACHE_DIR = ".geometry_cache"
+
+
+def _cache_path(path, column, cache_dir):
+    '''Key the cache on the source file identity (path, size, modification time) and the geometry column.'''
+    stat = os.stat(path)
+    key = f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}|{column}"
+    return os.path.join(cache_dir, hashlib.sha1(key.encode()).hexdigest())
+
+
+def _save(directory, geometries):
+    geometry_type, coords, offsets = shapely.to_ragged_array(geometries)
+    # The arrays are written to a temporary folder that is renamed into place, so stages running in parallel (1 and
+    # 1b) never read a cache another process is still writing
+    os.makedirs(os.path.dirname(directory), exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=os.path.dirname(directory))
+    np.save(os.path.join(tmp, "coords.npy"), coords)
+    for i, offset in enumerate(offsets):
+        np.save(os.path.join(tmp, f"offsets_{i}.npy"), offset)
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump({"geometry_type": int(geometry_type), "n_offsets": len(offsets)}, f)
+    try:
+        os.replace(tmp, directory)
+    except OSError:
+        # Another process has put the same cache in place first, or an interrupted run left a partial folder
+        if os.path.exists(os.path.join(directory, "meta.json")):
+            shutil.rmtree(tmp)
+        else:
+            shutil.rmtree(directory, ignore_errors=True)
+            os.replace(tmp, directory)
+
+
+def _load(directory):
+    with open(os.path.join(directory, "meta.json")) as f:
+        meta = json.load(f)
+    coords = np.load(os.path.join(directory, "coords.npy"), mmap_mode="r")
+    offsets = tuple(np.load(os.path.join(directory, f"offsets_{i}.npy"), mmap_mode="r") for i in range(meta["n_offsets"]))
+    return shapely.from_ragged_array(shapely.GeometryType(meta["geometry_type"]), coords, offsets)
+
+
+def load_geometries(path, column, cache_dir=CACHE_DIR):
+    '''Return the geometries of a WKT column in a CSV file as an array of Shapely objects.
+
+    The first call parses the column with shapely.from_wkt and stores the coordinates, on later calls the arrays are
+    memory-mapped from the cache. Mixed Polygon/MultiPolygon columns come back as MultiPolygons.'''
+    directory = _cache_path(path, column, cache_dir)
+    if os.path.exists(os.path.join(directory, "meta.json")):
+        return _load(directory)
+
+    wkt = pd.read_csv(path, usecols=[column])[column].to_numpy()
+    geometries = shapely.from_wkt(wkt)
+    _save(directory, geometries)
+    return geometries
+
+
+def read_csv_with_geometry(path, column, cache_dir=CACHE_DIR, **kwargs):
+    '''Read a CSV file like pd.read_csv, with the WKT column replaced by cached Shapely geometries.'''
+    columns = pd.read_csv(path, nrows=0, **kwargs).columns
+    df = pd.read_csv(path, usecols=lambda c: c != column, **kwargs)
+    df[column] = load_geometries(path, column, cache_dir)
+    return df[columns]
@@ -0,0 +1,49 @@
+''' title: "Wide gravitation features"
+    author: "Raza Mehar | Najam Mehdi | Pujan Thapa"
+    date: "2026-10-18"
+    description: Pivoting the long-form gravitation table (one row per daytype, time slot and datatype) into one wide
+                 feature vector per microcode, so merging it keeps exactly one row per store.'''
+
+# Import relevant packages and modules
+import pandas as pd
+
+GRAVITATION_PREFIX = "annual_average__"
+GRAVITATION_KEYS = ["daytype", "time_slot", "datatype"]
+
+
+def pivot_gravitation(gravitation):
+    '''Return one row per microcode with a float32 column per daytype x time_slot x datatype combination.
+
+    Columns are named annual_average__<daytype>__<time_slot>__<datatype>. Combinations missing for a microcode are
+    left as NaN for the imputation step.'''
+    wide = gravitation.pivot_table(index="microcode", columns=GRAVITATION_KEYS, values="annual_average", aggfunc="mean")
+    wide.columns = [GRAVITATION_PREFIX + "__".join(str(key) for key in keys) for keys in wide.columns]
+    return wide.astype("float32").reset_index()
+
+
+def gravitation_columns(df):
+    '''Return the wide gravitation columns of a dataframe, in order.'''
+    return [col for col in df.columns if col.startswith(GRAVITATION_PREFIX)]
+
+
+def is_wide(df):
+    '''Tell whether a dataframe carries gravitation in the wide layout.'''
+    return len(gravitation_columns(df)) > 0
+
+
+def _to_numeric(values):
+    try:
+        return pd.to_numeric(values)
+    except (ValueError, TypeError):
+        return values
+
+
+def melt_gravitation(df, id_vars=("store_ID",)):
+    '''Turn the wide gravitation columns back into daytype, time_slot, datatype and annual_average rows.
+
+    Only the analyses that group by those keys need this, the wide frame itself stays one row per store.'''
+    long = df.melt(id_vars=list(id_vars), value_vars=gravitation_columns(df), var_name="slot", value_name="annual_average")
+    keys = long["slot"].str[len(GRAVITATION_PREFIX):].str.split("__", expand=True)
+    for i, key in enumerate(GRAVITATION_KEYS):
+        long[key] = _to_numeric(keys[i])
+    return long.drop("slot", axis=1)
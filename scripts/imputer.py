@@ -0,0 +1,124 @@
+''' title: "Median and mode imputation"
+    author: "Raza Mehar | Najam Mehdi | Pujan Thapa"
+    date: "2026-10-18"
+    description: Computing the fill values of all numerical (median) and categorical (mode) columns in one pass over
+                 the block of columns, optionally per group (e.g. microcode or Comune) with the global value as
+                 fallback, or approximately from a stream of chunks (fit_streaming). The statistics are saved so
+                 that prediction inputs are filled with the same values.'''
+
+# Import relevant packages and modules
+import json
+import os
+import numpy as np
+import pandas as pd
+
+STATS_PATH = os.path.join("artifacts", "imputation_stats.json")
+# Number of weighted points kept per column by the streaming quantile sketch, the rank error is about 1 / SKETCH_SIZE
+SKETCH_SIZE = 2000
+
+
+def _python(value):
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _modes(df, cols, by=None):
+    '''Most frequent value of every column, the smallest one on ties like Series.mode().iloc[0].'''
+    modes = {}
+    for col in cols:
+        keys = [by, col] if by else [col]
+        counts = df.groupby(keys, observed=True, dropna=True).size().rename("count").reset_index()
+        counts = counts.sort_values(keys).sort_values("count", ascending=False, kind="stable")
+        if by:
+            modes[col] = counts.drop_duplicates(by).set_index(by)[col]
+        else:
+            modes[col] = counts[col].iloc[0] if len(counts) else np.nan
+    return modes
+
+
+def fit(df, median_cols, mode_cols, by=None):
+    '''Compute the medians of median_cols and the modes of mode_cols, per group of the column by if given.
+
+    The global values are always computed, they fill groups that have no value of their own.'''
+    block = df[median_cols].to_numpy(dtype=np.float64)
+    stats = {"by": by,
+             "medians": dict(zip(median_cols, map(float, np.nanmedian(block, axis=0)))) if len(df) else {},
+             "modes": {col: _python(value) for col, value in _modes(df, mode_cols).items()}}
+    if by:
+        medians = df.groupby(by, observed=True)[median_cols].median()
+        stats["group_medians"] = {col: [[_python(g), float(v)] for g, v in medians[col].dropna().items()]
+                                  for col in median_cols}
+        stats["group_modes"] = {col: [[_python(g), _python(v)] for g, v in modes.items()]
+                                for col, modes in _modes(df, mode_cols, by).items()}
+    return stats
+
+
+def _compress(values, weights, size):
+    '''Reduce sorted weighted points to at most size points of about equal weight, keeping their weighted means.'''
+    if len(values) <= size:
+        return values, weights
+    bucket = np.minimum((np.cumsum(weights) - weights / 2) / weights.sum() * size, size - 1).astype(np.int64)
+    total = np.bincount(bucket, weights=weights, minlength=size)
+    mean = np.bincount(bucket, weights=values * weights, minlength=size)
+    keep = total > 0
+    return mean[keep] / total[keep], total[keep]
+
+
+def _sketch_median(values, weights):
+    if not len(values):
+        return np.nan
+    position = np.cumsum(weights) - weights / 2
+    return float(np.interp(weights.sum() / 2, position, values))
+
+
+def fit_streaming(chunks, median_cols, mode_cols, sketch_size=SKETCH_SIZE):
+    '''Compute global fill values from an iterable of dataframe chunks, holding only one chunk at a time.
+
+    Modes are exact. Medians come from a mergeable quantile sketch and are approximate.'''
+    sketches = {col: (np.empty(0), np.empty(0)) for col in median_cols}
+    counts = {col: pd.Series(dtype=np.int64) for col in mode_cols}
+    for chunk in chunks:
+        for col in median_cols:
+            new = chunk[col].to_numpy(dtype=np.float64)
+            new = new[~np.isnan(new)]
+            values = np.concatenate([sketches[col][0], new])
+            weights = np.concatenate([sketches[col][1], np.ones(len(new))])
+            order = np.argsort(values, kind="stable")
+            sketches[col] = _compress(values[order], weights[order], sketch_size)
+        for col in mode_cols:
+            counts[col] = counts[col].add(chunk[col].value_counts(dropna=True), fill_value=0)
+
+    modes = {}
+    for col, count in counts.items():
+        count = count.sort_index(kind="stable").sort_values(ascending=False, kind="stable")
+        modes[col] = _python(count.index[0]) if len(count) else None
+    return {"by": None, "medians": {col: _sketch_median(*sketches[col]) for col in median_cols}, "modes": modes}
+
+
+def transform(df, stats):
+    '''Return a copy of df with missing values filled from the statistics, columns it does not have are skipped.
+
+    With per-group statistics every row is filled with the value of its group, or the global value when the group
+    has none or df has no group column.'''
+    df = df.copy()
+    by = stats["by"]
+    for kind, group_kind in (("medians", "group_medians"), ("modes", "group_modes")):
+        for col, value in stats[kind].items():
+            if col not in df.columns:
+                continue
+            fill = pd.Series(value, index=df.index, dtype=object if kind == "modes" else np.float64)
+            if by and by in df.columns and stats[group_kind].get(col):
+                groups, values = zip(*stats[group_kind][col])
+                fill = df[by].map(pd.Series(values, index=groups)).astype(fill.dtype).fillna(fill)
+            df[col] = df[col].fillna(fill)
+    return df
+
+
+def save(stats, path=STATS_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(stats, f, indent=1)
+
+
+def load(path=STATS_PATH):
+    with open(path) as f:
+        return json.load(f)
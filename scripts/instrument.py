@@ -0,0 +1,75 @@
+''' title: "Per-step instrumentation"
+    author: "Raza Mehar | Najam Mehdi | Pujan Thapa"
+    date: "2026-10-18"
+    description: Timing the named steps of the scripts (load, geo-join, merge, impute, encode, fit, predict, render)
+                 with wall time, CPU time, the RSS high-water mark and the rows and columns they produce, written as
+                 one JSON line per step. Quiet mode skips the console diagnostics (head, info, describe), which
+                 cost time on large frames.
+
+    environment: FATER_TRACE  JSON-lines file the steps are appended to (no trace when unset)
+                 FATER_QUIET  set to 1 to skip the console diagnostics'''
+
+# Import relevant packages and modules
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, the RSS high-water mark is then left out of the trace
+    resource = None
+
+TRACE_PATH = os.environ.get("FATER_TRACE")
+QUIET = os.environ.get("FATER_QUIET", "") not in ("", "0")
+
+
+def verbose():
+    '''Tell whether the console diagnostics should be printed.'''
+    return not QUIET
+
+
+def max_rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2 ** 20
+
+
+class Step:
+    def __init__(self, name):
+        self.name = name
+        self.rows = None
+        self.columns = None
+
+    def record(self, data):
+        '''Note the size of the step's output and return it unchanged.'''
+        shape = data.shape if hasattr(data, "shape") else (len(data),)
+        self.rows = int(shape[0])
+        self.columns = int(shape[1]) if len(shape) > 1 else None
+        return data
+
+
+@contextmanager
+def step(name):
+    '''Measure the enclosed block as the step called name.
+
+    The yielded Step takes the step's output with record(). Processes started by the step (e.g. joblib workers)
+    are not part of the CPU time and RSS.'''
+    current = Step(name)
+    started = time.strftime("%Y-%m-%dT%H:%M:%S")
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield current
+    finally:
+        if TRACE_PATH:
+            entry = {"script": os.path.basename(sys.argv[0]), "step": name, "pid": os.getpid(),
+                     "start": started, "wall_s": time.perf_counter() - wall,
+                     "cpu_s": time.process_time() - cpu, "max_rss_mb": max_rss_mb(),
+                     "rows": current.rows, "columns": current.columns}
+            # One write per line in append mode, so parallel stages can share the trace file
+            with open(TRACE_PATH, "a") as f:
+                f.write(json.dumps(entry) + "\n")
@@ -0,0 +1,83 @@
+''' title: "Chunked ISTAT loader"
+    author: "Raza Mehar | Najam Mehdi | Pujan Thapa"
+    date: "2026-10-18"
+    description: Streaming the national ISTAT csv files in blocks with pyarrow, reading only the needed columns,
+                 dropping the rows outside the province, year and age filters on the Arrow batches before they
+                 become dataframes, and summing them into a small aggregate block by block, so the national files
+                 never have to fit in memory. Aggregates are cached as Parquet files keyed by the source file and
+                 the query, and reused as long as the source file is unchanged.'''
+
+# Import relevant packages and modules
+import hashlib
+import json
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pv
+
+CACHE_DIR = ".istat_cache"
+# Bytes of csv parsed per batch
+BLOCK_SIZE = 32 << 20
+# Number of per-chunk partial sums kept before they are combined
+COMBINE_EVERY = 16
+
+
+def _cache_key(path, value, by, filters):
+    stat = os.stat(path)
+    payload = json.dumps([os.path.abspath(path), stat.st_size, stat.st_mtime_ns, value, by, filters], sort_keys=True)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def _mask(batch, filters):
+    '''Rows of an Arrow batch whose columns hold one of the wanted values of every filter.'''
+    mask = None
+    for col, values in filters.items():
+        column = batch.column(col)
+        keep = pc.is_in(column, value_set=pa.array(values).cast(column.type))
+        mask = keep if mask is None else pc.and_(mask, keep)
+    return mask
+
+
+def _combine(partials, by):
+    return pd.concat(partials).groupby(level=by, observed=True).sum()
+
+
+def aggregate_csv(path, value, by, filters=None, block_size=BLOCK_SIZE, cache_dir=CACHE_DIR):
+    '''Return the sum of the column value per combination of the columns by, over the rows of a csv that pass filters.
+
+    filters maps a column to the list of values to keep (e.g. {"Province": ["Napoli"], "Year": [2022, 2023]}),
+    columns not in by are only read to be filtered on. The filters are applied to the Arrow batches, rows that do
+    not pass never reach pandas. The result is a flat dataframe with the by columns and value.'''
+    filters = {col: list(values) for col, values in (filters or {}).items()}
+    by = list(by)
+    cache_path = os.path.join(cache_dir, f"{_cache_key(path, value, by, filters)}.parquet") if cache_dir else None
+    if cache_path and os.path.exists(cache_path):
+        return pd.read_parquet(cache_path)
+
+    columns = list(dict.fromkeys(by + list(filters) + [value]))
+    # Text columns repeat a handful of values, as categories every block holds small integer codes instead
+    text_columns = [col for col in columns if col not in ("Year", value)]
+    reader = pv.open_csv(path, read_options=pv.ReadOptions(block_size=block_size),
+                         convert_options=pv.ConvertOptions(include_columns=columns,
+                                                           column_types={col: pa.string() for col in text_columns}))
+
+    partials = []
+    for batch in reader:
+        if filters:
+            batch = batch.filter(_mask(batch, filters))
+        if batch.num_rows:
+            chunk = batch.to_pandas().astype({col: "category" for col in text_columns})
+            partials.append(chunk.groupby(by, observed=True)[value].sum())
+        if len(partials) >= COMBINE_EVERY:
+            partials = [_combine(partials, by)]
+
+    if partials:
+        result = _combine(partials, by).reset_index()
+    else:
+        result = pd.DataFrame({col: pd.Series(dtype=object) for col in by}).assign(**{value: pd.Series(dtype=float)})
+
+    if cache_path:
+        os.makedirs(cache_dir, exist_ok=True)
+        result.to_parquet(cache_path, index=False)
+    return result
@@ -0,0 +1,87 @@
+''' title: "Parallel, budgeted hyperparameter search"
+    author: "Raza Mehar | Najam Mehdi | Pujan Thapa"
+    date: "2026-10-18"
+    description: Grid search that evaluates every (candidate, fold) pair in parallel, optionally eliminates weak
+                 candidates early with successive halving, and keeps a persistent cache of (model, params, fold,
+                 budget) -> score so that extending a grid only evaluates the new points.'''
+
+# Import relevant packages and modules
+import math
+import os
+import time
+import joblib
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.metrics import get_scorer
+from sklearn.model_selection import ParameterGrid
+from cv_engine import take
+
+CACHE_PATH = ".search_cache.joblib"
+
+
+def _fit_and_score(model, params, X, y, train_idx, test_idx, scorer):
+    estimator = clone(model).set_params(**params)
+    start = time.perf_counter()
+    estimator.fit(take(X, train_idx), y.iloc[train_idx])
+    fit_time = time.perf_counter() - start
+    return scorer(estimator, take(X, test_idx), y.iloc[test_idx]), fit_time
+
+
+def _cache_key(model, params, fold, budget, data_key, scoring):
+    # The base estimator's own parameters (random_state, n_jobs, ...) and the scoring are part of the key, so
+    # changing either does not reuse stale scores
+    return (type(model).__name__, repr(sorted(model.get_params().items())), repr(sorted(params.items())), fold,
+            budget, data_key, repr(scoring))
+
+
+def search(model, param_grid, X, y, cv, scoring="neg_mean_squared_error", halving=False, factor=3,
+           n_jobs=-1, cache_path=CACHE_PATH):
+    '''Evaluate a parameter grid with cross-validation and return the best parameters and the per-candidate results.
+
+    With halving=True every round fits the surviving candidates on a larger share of each training fold and keeps
+    the best 1/factor of them, the last round uses the full folds. Scores and fit times are cached in cache_path,
+    keyed by model (with its base parameters), parameters, fold, training budget, scoring and a hash of the data
+    and folds.'''
+    scorer = get_scorer(scoring)
+    # cv is a splitter or a list of (train, test) index arrays, such as cv_engine.grouped_folds
+    folds = list(cv.split(X, y)) if hasattr(cv, "split") else list(cv)
+    data_key = joblib.hash((X, y, [test for _, test in folds]))
+    cache = joblib.load(cache_path) if cache_path and os.path.exists(cache_path) else {}
+
+    candidates = list(ParameterGrid(param_grid))
+    n_rounds = 1 + int(math.log(len(candidates), factor)) if halving and len(candidates) > 1 else 1
+    # Every round subsamples the training folds in the same fixed order, so budgets are nested and reproducible
+    order = [np.random.RandomState(fold).permutation(len(train)) for fold, (train, _) in enumerate(folds)]
+
+    rows = []
+    for round_ in range(n_rounds):
+        share = 1.0 / factor ** (n_rounds - 1 - round_)
+        jobs, keys = [], []
+        for params in candidates:
+            for fold, (train, test) in enumerate(folds):
+                budget = max(1, int(len(train) * share))
+                key = _cache_key(model, params, fold, budget, data_key, scoring)
+                keys.append(key)
+                if key not in cache:
+                    jobs.append((key, delayed(_fit_and_score)(model, params, X, y, train[order[fold][:budget]], test, scorer)))
+
+        results = Parallel(n_jobs=n_jobs)(job for _, job in jobs)
+        cache.update((key, result) for (key, _), result in zip(jobs, results))
+
+        n_folds = len(folds)
+        for i, params in enumerate(candidates):
+            scores, fit_times = zip(*(cache[key] for key in keys[i * n_folds:(i + 1) * n_folds]))
+            rows.append({"round": round_, "share": share, "params": params, "mean_score": np.mean(scores),
+                         "std_score": np.std(scores), "mean_fit_time": np.mean(fit_times)})
+
+        ranked = sorted(rows[-len(candidates):], key=lambda row: row["mean_score"], reverse=True)
+        candidates = [row["params"] for row in ranked[:max(1, math.ceil(len(candidates) / factor))]]
+
+    if cache_path:
+        joblib.dump(cache, cache_path)
+
+    results = pd.DataFrame(rows)
+    best = results[results["round"] == n_rounds - 1].sort_values("mean_score", ascending=False).iloc[0]
+    return {"best_params": best["params"], "best_score": best["mean_score"], "results": results}
@@ -0,0 +1,124 @@
+''' title: "Batched nonparametric tests"
+    author: "Raza Mehar | Najam Mehdi | Pujan Thapa"
+    date: "2026-10-18"
+    description: Running the Kruskal-Wallis test (and the Mann-Whitney U test for two-level features) of a target
+                 against several categorical features, overall and within subgroups such as Comune, in one call. The
+                 target is ranked once per subgroup and every test of that subgroup reuses the ranks, the tests
+                 being sums of ranks per level computed with bincount. Permutation p-values with Monte Carlo
+                 confidence intervals come from batches of label permutations run in parallel processes. The data
+                 is reduced to one row per store first, since every store is repeated once per gravitation record.'''
+
+# Import relevant packages and modules
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from scipy.stats import beta, chi2, norm, rankdata
+
+ALL = "All"
+
+
+def store_level(df, columns, store="store_ID"):
+    '''One row per store with the given columns, which must not vary between the rows of a store.'''
+    return df[[store] + [col for col in columns if col != store]].drop_duplicates(store).reset_index(drop=True)
+
+
+def _tie_sum(values):
+    '''Sum of t^3 - t over the groups of tied values.'''
+    counts = np.unique(values, return_counts=True)[1].astype(np.float64)
+    return (counts ** 3 - counts).sum()
+
+
+def _rank_sums(ranks, codes, k):
+    return np.bincount(codes, weights=ranks, minlength=k)
+
+
+def _permutation_counts(ranks, codes, k, observed, n_permutations, seed):
+    '''Number of label permutations whose sum of R_g^2 / n_g reaches the observed one.
+
+    That sum orders the permutations like the Kruskal-Wallis H and, for two levels, like the two-sided
+    Mann-Whitney U.'''
+    rng = np.random.default_rng(seed)
+    sizes = np.bincount(codes, minlength=k)
+    permuted = rng.permuted(np.broadcast_to(codes, (n_permutations, len(codes))), axis=1)
+    # One bincount for the whole batch, every permutation gets its own block of k bins
+    offsets = (np.arange(n_permutations) * k)[:, None]
+    sums = np.bincount((permuted + offsets).ravel(), weights=np.tile(ranks, n_permutations),
+                       minlength=n_permutations * k).reshape(n_permutations, k)
+    statistic = (sums ** 2 / sizes).sum(axis=1)
+    return int((statistic >= observed * (1 - 1e-12)).sum())
+
+
+def _test(ranks, tie_sum, codes, k):
+    '''Kruskal-Wallis and, with two levels, Mann-Whitney U statistics and asymptotic p-values from shared ranks.'''
+    n = len(ranks)
+    sizes = np.bincount(codes, minlength=k).astype(np.float64)
+    sums = _rank_sums(ranks, codes, k)
+    observed = (sums ** 2 / sizes).sum()
+    correction = 1 - tie_sum / (n ** 3 - n) if n > 1 else 1.0
+    h = (12 / (n * (n + 1)) * observed - 3 * (n + 1)) / correction if correction > 0 else np.nan
+    result = {"n": n, "levels": k, "kruskal_H": h, "kruskal_p": chi2.sf(h, k - 1)}
+    if k == 2:
+        # U of the first level, two-sided p-value with tie and continuity correction like scipy's asymptotic method
+        n1, n2 = sizes
+        u = sums[0] - n1 * (n1 + 1) / 2
+        sigma = np.sqrt(n1 * n2 / 12 * ((n + 1) - tie_sum / (n * (n - 1))))
+        z = (max(u, n1 * n2 - u) - n1 * n2 / 2 - 0.5) / sigma if sigma > 0 else np.nan
+        result.update({"mannwhitney_U": u, "mannwhitney_p": min(1.0, 2 * norm.sf(z))})
+    return result, observed
+
+
+def _subgroups(df, by):
+    yield None, ALL, df
+    for col in by:
+        for value, sub in df.groupby(col, observed=True, sort=True):
+            yield col, value, sub
+
+
+def run_tests(df, target, features, by=(), n_permutations=9999, confidence=0.95, n_jobs=-1, seed=0,
+              batch_size=1000):
+    '''Test target against every feature, on all rows and within every subgroup of the columns in by.
+
+    Returns one row per subgroup and feature with the number of rows and levels, the Kruskal-Wallis H and p-value,
+    the Mann-Whitney U and p-value for two-level features, and the permutation p-value with its confidence
+    interval (n_permutations=0 skips the permutations). Features with fewer than two levels in a subgroup are
+    left out.'''
+    rows, jobs = [], []
+    for by_col, value, sub in _subgroups(df, list(by)):
+        y = sub[target].to_numpy(dtype=np.float64)
+        present = ~np.isnan(y)
+        ranks, tie_sum = rankdata(y[present]), _tie_sum(y[present])
+        for feature in features:
+            codes = pd.factorize(sub[feature], sort=True)[0][present]
+            if (codes < 0).any():
+                # Rows without a level are left out, the ranks of the remaining rows have to be recomputed
+                keep = codes >= 0
+                feature_ranks, feature_ties = rankdata(y[present][keep]), _tie_sum(y[present][keep])
+                codes = codes[keep]
+            else:
+                feature_ranks, feature_ties = ranks, tie_sum
+            # Levels without a target value are dropped from the codes
+            codes = np.unique(codes, return_inverse=True)[1]
+            k = int(codes.max()) + 1 if len(codes) else 0
+            if k < 2:
+                continue
+            result, observed = _test(feature_ranks, feature_ties, codes, k)
+            rows.append({"by": by_col or ALL, "subgroup": value, "feature": feature, **result})
+            for start in range(0, n_permutations, batch_size):
+                jobs.append((len(rows) - 1, (feature_ranks, codes, k, observed, min(batch_size, n_permutations - start))))
+
+    seeds = np.random.SeedSequence(seed).spawn(len(jobs))
+    counts = Parallel(n_jobs=n_jobs)(delayed(_permutation_counts)(*args, seed=s) for (_, args), s in zip(jobs, seeds))
+    exceed = np.zeros(len(rows), dtype=np.int64)
+    np.add.at(exceed, np.asarray([row for row, _ in jobs], dtype=np.int64), np.asarray(counts, dtype=np.int64))
+
+    results = pd.DataFrame(rows, columns=["by", "subgroup", "feature", "n", "levels", "kruskal_H", "kruskal_p",
+                                          "mannwhitney_U", "mannwhitney_p"])
+    if n_permutations:
+        # Clopper-Pearson interval of the share of permutations at least as extreme as the data
+        alpha = 1 - confidence
+        results["permutation_p"] = (exceed + 1) / (n_permutations + 1)
+        low = beta.ppf(alpha / 2, np.maximum(exceed, 1), n_permutations - exceed + 1)
+        high = beta.ppf(1 - alpha / 2, exceed + 1, np.maximum(n_permutations - exceed, 1))
+        results["permutation_ci_low"] = np.where(exceed > 0, low, 0.0)
+        results["permutation_ci_high"] = np.where(exceed < n_permutations, high, 1.0)
+    return results
@@ -0,0 +1,137 @@
+''' title: "Incremental store onboarding"
+    author: "Raza Mehar | Najam Mehdi | Pujan Thapa"
+    date: "2026-10-18"
+    description: Bringing 1_stores_with_microcodes, 2_stores_preprocessed and 3_stores_encoded up to date after the
+                 store list changes, by processing only the stores that are new or whose row changed (store_ID plus
+                 a hash of the row), together with the stores near them whose competitor features change, and
+                 dropping the stores that were removed. The cached polygons, the microcode tables (kept as Parquet
+                 copies and read with a microcode filter), the saved imputation statistics and the one-hot
+                 vocabulary are reused, so nothing is recomputed for the unchanged stores.
+
+    usage: python onboard_stores.py [--province CODE]   (run from the data folder after a full pipeline run)'''
+
+# Import relevant packages and modules
+import argparse
+import os
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import shapely
+import imputer
+from competitor_features import HYPERMARKET_TYPE, stores_near, within
+from geo_utils import store_points, assign_microcodes
+from geometry_cache import read_csv_with_geometry
+from gravitation_features import is_wide
+from onehot_encoder import load_vocabulary, encode
+from province_ingest import build_stores, input_path
+from stage_io import read_stage, write_stage
+
+HASHES_PATH = os.path.join("artifacts", "store_hashes.parquet")
+TABLES_DIR = os.path.join("artifacts", "microcode_tables")
+
+
+def store_hashes(stores):
+    '''One hash per store over all the columns of its row (the csv index column is ignored).'''
+    content = stores.drop(columns=["Unnamed: 0"], errors="ignore")
+    return pd.DataFrame({"store_ID": stores["Cod3HD"].to_numpy(),
+                         "hash": pd.util.hash_pandas_object(content, index=False).to_numpy()})
+
+
+def changed_stores(hashes, previous):
+    '''Return the store_IDs that are new or changed and the ones that disappeared.'''
+    merged = hashes.merge(previous, on="store_ID", how="outer", suffixes=("", "_previous"), indicator=True)
+    changed = merged.loc[(merged["_merge"] == "left_only") |
+                         ((merged["_merge"] == "both") & (merged["hash"] != merged["hash_previous"])), "store_ID"]
+    removed = merged.loc[merged["_merge"] == "right_only", "store_ID"]
+    return set(changed), set(removed)
+
+
+def microcode_table(path, microcodes):
+    '''Read the rows of a microcode csv for some microcodes, from a Parquet copy refreshed when the csv changes.'''
+    copy = os.path.join(TABLES_DIR, os.path.basename(path).replace(".csv", ".parquet"))
+    if not os.path.exists(copy) or os.path.getmtime(copy) < os.path.getmtime(path):
+        os.makedirs(TABLES_DIR, exist_ok=True)
+        pd.read_csv(path).to_parquet(copy, index=False)
+    # Microcodes come back from the polygon lookup as floats, the tables hold them as integers
+    return pd.read_parquet(copy, filters=[("microcode", "in", sorted(int(code) for code in microcodes))])
+
+
+def upsert(name, new_rows, store_ids):
+    '''Replace the rows of the given stores in a stage output by new_rows, keeping the stage's column order.'''
+    existing = read_stage(name)
+    kept = existing[~existing["store_ID"].isin(store_ids)]
+    write_stage(pd.concat([kept, new_rows[existing.columns]], ignore_index=True), name)
+    return len(existing) - len(kept), len(new_rows)
+
+
+def onboard(province="NA"):
+    stores = pd.read_csv(input_path("stores", province))
+    hashes = store_hashes(stores)
+    if not os.path.exists(HASHES_PATH):
+        os.makedirs(os.path.dirname(HASHES_PATH), exist_ok=True)
+        hashes.to_parquet(HASHES_PATH, index=False)
+        print(f"Recorded {len(hashes)} stores, later runs only process the stores that change.")
+        return
+    changed, removed = changed_stores(hashes, pd.read_parquet(HASHES_PATH))
+    print(f"{len(changed)} new or changed stores, {len(removed)} removed stores.")
+    if not changed and not removed:
+        return
+
+    # The competitor features change around every new, changed or removed store (old and new position), so the
+    # stores within reach of them are processed again too
+    previous = read_stage("1_stores_with_microcodes", columns=["store_ID", "Point", "store_type", "nearest_hypermarket_m"])
+    previous = previous.drop_duplicates("store_ID")
+    previous_points = previous["Point"].to_numpy()
+    previous_points = np.column_stack([shapely.get_y(previous_points), shapely.get_x(previous_points)])
+    moved = previous["store_ID"].isin(changed | removed).to_numpy()
+    current = stores[stores["Cod3HD"].isin(changed)]
+    points = np.concatenate([previous_points[moved], current[["Lat", "Long"]].to_numpy(dtype=np.float64)])
+    changed |= stores_near(stores.rename(columns={"Cod3HD": "store_ID"}), points) - removed
+
+    # A new, moved or removed hypermarket changes the nearest hypermarket distance of the stores it is (or was) closer
+    # to than their nearest hypermarket, however far that is. The stored distances are float32, hence the extra metre.
+    hypermarkets = np.concatenate([
+        previous_points[moved & (previous["store_type"] == HYPERMARKET_TYPE).to_numpy()],
+        current.loc[current["TipologiaPdV"] == HYPERMARKET_TYPE, ["Lat", "Long"]].to_numpy(dtype=np.float64)])
+    limits = previous["nearest_hypermarket_m"].astype(np.float64).fillna(np.inf).to_numpy() + 1
+    closer = within(previous_points[:, 0], previous_points[:, 1], limits, hypermarkets)
+    changed |= set(previous.loc[closer, "store_ID"]) - removed
+    print(f"{len(changed)} stores are processed, with the neighbours whose competitor features change.")
+
+    # Stage 1: geo-join of the changed stores only, against the cached polygons and the needed microcode rows
+    new_stores = stores[stores["Cod3HD"].isin(changed)]
+    shapes = read_csv_with_geometry(input_path("shapes", province), "geometry")
+    microcodes = set(assign_microcodes(store_points(new_stores), shapes["geometry"], shapes["microcode"]).dropna())
+    wide = is_wide(pd.DataFrame(columns=pq.read_schema("1_stores_with_microcodes.parquet").names))
+    stage1 = build_stores(new_stores, shapes, microcode_table(input_path("socio_demo", province), microcodes),
+                          microcode_table(input_path("gravitation", province), microcodes), wide, competitors=stores)
+
+    # Stage 2: fill missing values with the saved statistics, after the same type conversion as 2_Pre-process.py
+    stage2 = stage1.copy()
+    for col in ["microcode", "daytype", "time_slot"]:
+        if col in stage2:
+            stage2[col] = stage2[col].astype("object")
+    stage2 = imputer.transform(stage2, imputer.load())
+
+    # Stage 3: one-hot encode with the saved vocabulary, the columns 3a_Analyze.py drops are not selected by upsert
+    vocabulary = load_vocabulary()
+    unseen = {col: sorted(set(stage2[col].dropna()) - set(values)) for col, values in vocabulary["columns"].items()
+              if col in stage2}
+    for col, values in unseen.items():
+        if values:
+            print(f"Unseen {col} values {values} are encoded as all zeros, re-run 3a to add them to the vocabulary.")
+    stage3 = encode(stage2, vocabulary, sparse_columns=False)
+
+    store_ids = changed | removed
+    for name, rows in (("1_stores_with_microcodes", stage1), ("2_stores_preprocessed", stage2),
+                       ("3_stores_encoded", stage3)):
+        dropped, added = upsert(name, rows, store_ids)
+        print(f"{name}: {dropped} rows replaced or removed, {added} rows added.")
+    hashes.to_parquet(HASHES_PATH, index=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Update the stage outputs for new, changed and removed stores.")
+    parser.add_argument("--province", default="NA", help="province code of the input files, NA for stores_NA.csv")
+    args = parser.parse_args()
+    onboard(args.province)
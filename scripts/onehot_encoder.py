@@ -0,0 +1,88 @@
+''' title: "Sparse one-hot encoding with a persisted vocabulary"
+    author: "Raza Mehar | Najam Mehdi | Pujan Thapa"
+    date: "2026-10-18"
+    description: One-hot encoding the categorical store and gravitation features into a sparse CSR matrix. The
+                 categories and column order seen at training time are saved once and reused to encode prediction
+                 inputs, so a new file with fewer or unseen categories still gets exactly the training columns. The
+                 models are fit on a dense float32 design matrix of the numeric columns and the one-hot block.'''
+
+# Import relevant packages and modules
+import json
+import os
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+VOCABULARY_PATH = os.path.join("artifacts", "onehot_vocabulary.json")
+
+
+def fit_vocabulary(df, columns):
+    '''Collect the sorted categories of every column, giving the same column names and order as pd.get_dummies.'''
+    categories = {}
+    for col in columns:
+        values = df[col].dropna().unique()
+        categories[col] = sorted(value.item() if isinstance(value, np.generic) else value for value in values)
+    return {"columns": categories,
+            "feature_names": [f"{col}_{value}" for col, values in categories.items() for value in values]}
+
+
+def save_vocabulary(vocabulary, path=VOCABULARY_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(vocabulary, f, indent=1)
+
+
+def load_vocabulary(path=VOCABULARY_PATH):
+    with open(path) as f:
+        return json.load(f)
+
+
+def transform(df, vocabulary):
+    '''Return the one-hot CSR matrix (rows x vocabulary features, bool) of the vocabulary columns of df.
+
+    Values that are missing or not in the vocabulary leave all the columns of that feature at zero.'''
+    offsets = np.cumsum([0] + [len(values) for values in vocabulary["columns"].values()])
+    columns = []
+    for (col, values), offset in zip(vocabulary["columns"].items(), offsets[:-1]):
+        codes = pd.Categorical(df[col], categories=values).codes.astype(np.int64)
+        columns.append(np.where(codes >= 0, codes + offset, -1))
+    indices = np.stack(columns, axis=1)
+    present = indices >= 0
+
+    indptr = np.concatenate([[0], np.cumsum(present.sum(axis=1))])
+    data = np.ones(present.sum(), dtype=bool)
+    return sparse.csr_matrix((data, indices[present], indptr), shape=(len(df), offsets[-1]))
+
+
+def encode(df, vocabulary, sparse_columns=True):
+    '''Replace the vocabulary columns of df with their one-hot columns, other columns are kept as they are.
+
+    The one-hot columns are sparse pandas columns unless sparse_columns is False. Frames without any of the
+    vocabulary columns (e.g. already encoded inputs) are returned unchanged.'''
+    if not any(col in df.columns for col in vocabulary["columns"]):
+        return df
+    matrix = transform(df, vocabulary)
+    if sparse_columns:
+        # Sparse bool columns cannot be built directly, the fill value 0 of a bool matrix is rejected
+        encoded = pd.DataFrame.sparse.from_spmatrix(matrix.astype(np.uint8), index=df.index, columns=vocabulary["feature_names"])
+        encoded = encoded.astype(pd.SparseDtype(bool, False))
+    else:
+        encoded = pd.DataFrame(matrix.toarray(), index=df.index, columns=vocabulary["feature_names"])
+    return pd.concat([df.drop(columns=list(vocabulary["columns"])), encoded], axis=1)
+
+
+def design_matrix(df, vocabulary):
+    '''Return the dense float32 array of the numeric columns of df followed by its one-hot columns, and its column names.
+
+    df holds either the raw vocabulary columns (encoded through the sparse matrix) or their one-hot columns (as read
+    back from 3_stores_encoded). The numeric block is mostly non-zero, and trees fit several times faster on a dense
+    array than on CSR, so the one-hot block is densified here, right before fitting.'''
+    feature_names = vocabulary["feature_names"]
+    numeric_columns = [col for col in df.columns if col not in vocabulary["columns"] and col not in feature_names]
+    X = np.empty((len(df), len(numeric_columns) + len(feature_names)), dtype=np.float32)
+    X[:, :len(numeric_columns)] = df[numeric_columns].to_numpy(dtype=np.float32)
+    if any(col in df.columns for col in vocabulary["columns"]):
+        X[:, len(numeric_columns):] = transform(df, vocabulary).toarray()
+    else:
+        X[:, len(numeric_columns):] = df.reindex(columns=feature_names, fill_value=False).to_numpy(dtype=np.float32)
+    return X, numeric_columns + feature_names
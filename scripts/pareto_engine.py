@@ -0,0 +1,55 @@
+''' title: "Pareto index"
+    author: "Raza Mehar | Najam Mehdi | Pujan Thapa"
+    date: "2026-10-18"
+    description: Keeping, for every dimension (store_ID, store_type, Comune, microcode), the entities sorted by mean
+                 potential with their cumulative share, so that "which k entities make up X% of the potential" is a
+                 binary search, and summarising long curves into a fixed number of rank bins for plotting instead
+                 of drawing one bar per entity.'''
+
+# Import relevant packages and modules
+import os
+import numpy as np
+import pandas as pd
+
+INDEX_DIR = os.path.join("artifacts", "pareto")
+
+
+def build_index(df, dimension, value="potential"):
+    '''Mean value per entity of dimension, sorted in descending order, with the running sum and its share in %.'''
+    index = df.groupby(dimension, observed=True)[value].mean().sort_values(ascending=False).reset_index()
+    index["Cumulative"] = index[value].cumsum()
+    index["Cumulative %"] = (index["Cumulative"] / index["Cumulative"].iloc[-1]) * 100
+    return index
+
+
+def top_for_share(index, share):
+    '''Number of leading entities whose cumulative share stays within share %, found by binary search.'''
+    return int(np.searchsorted(index["Cumulative %"].to_numpy(), share, side="right"))
+
+
+def share_of_top(index, k):
+    '''Cumulative share in % of the k leading entities.'''
+    return float(index["Cumulative %"].iloc[k - 1]) if k > 0 else 0.0
+
+
+def binned_curve(index, value="potential", bins=200):
+    '''Summarise the index into at most bins groups of consecutive ranks.
+
+    Every bin has the rank range it covers, the mean value of its entities and the cumulative share at its last
+    entity, so the Pareto curve keeps its shape whatever the number of entities.'''
+    n = len(index)
+    edges = np.unique(np.linspace(0, n, min(bins, n) + 1).astype(np.int64))
+    starts, stops = edges[:-1], edges[1:]
+    sums = np.add.reduceat(index[value].to_numpy(dtype=np.float64), starts)
+    return pd.DataFrame({"first_rank": starts + 1, "last_rank": stops, value: sums / (stops - starts),
+                         "Cumulative %": index["Cumulative %"].to_numpy()[stops - 1]})
+
+
+def save_index(index, dimension, directory=INDEX_DIR):
+    os.makedirs(directory, exist_ok=True)
+    # Entities of every dimension are stored as text, so mixed key types (codes, names) share one format
+    index.astype({dimension: str}).to_parquet(os.path.join(directory, f"{dimension}.parquet"), index=False)
+
+
+def load_index(dimension, directory=INDEX_DIR):
+    return pd.read_parquet(os.path.join(directory, f"{dimension}.parquet"))
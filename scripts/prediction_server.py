@@ -0,0 +1,210 @@
+''' title: "Batch prediction server"
+    author: "Raza Mehar | Najam Mehdi | Pujan Thapa"
+    date: "2026-10-18"
+    description: Local HTTP service that keeps the registered potential model loaded, accepts JSON, CSV or Arrow
+                 batches of candidate stores, adds their competitor features, fills and one-hot encodes them like
+                 5a_User_Prediction.py, groups
+                 concurrent requests into single predict calls and exposes latency and throughput counters. Random forests are served from the memory-mapped compiled
+                 arrays, so several server processes on one host share a single copy of the model.
+
+    usage: python prediction_server.py [--host HOST] [--port PORT] [--model NAME] [--stores CSV] [--max-batch-rows N]
+                                       [--max-wait-ms MS]
+
+    endpoints: POST /predict  body in JSON (list of records, or {"columns": [...], "data": [[...], ...]}), CSV
+                              (Content-Type: text/csv) or Arrow IPC stream (Content-Type: application/vnd.apache.arrow.stream),
+                              answers {"predictions": [...]}
+               GET /metrics   request, row and batch counters, latency percentiles and throughput
+               GET /health    model name and feature columns'''
+
+# Import relevant packages and modules
+import argparse
+import io
+import json
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import pandas as pd
+from artifacts import load_model, load_compiled_model
+from forest_engine import predict
+from competitor_features import add_competitor_features
+from onehot_encoder import load_vocabulary, encode
+from province_ingest import STORE_COLUMNS
+import imputer
+
+
+class MicroBatcher:
+    '''Collects the frames of concurrent requests and predicts them together in one call.'''
+
+    def __init__(self, predict_fn, feature_columns, prepare_fn=None, max_batch_rows=4096, max_wait_ms=5):
+        self.predict_fn = predict_fn
+        self.prepare_fn = prepare_fn
+        self.feature_columns = feature_columns
+        self.max_batch_rows = max_batch_rows
+        self.max_wait = max_wait_ms / 1000
+        self.pending = queue.Queue()
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.counters = {"requests": 0, "rows": 0, "batches": 0, "errors": 0}
+        self.latencies = deque(maxlen=10000)
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, frame):
+        '''Queue a frame for prediction and return a future with its predictions.
+
+        The frame is prepared, checked and converted to float32 here, so a malformed request fails on its own instead
+        of failing the batch it would have joined.'''
+        try:
+            if self.prepare_fn is not None:
+                frame = self.prepare_fn(frame)
+            missing = [col for col in self.feature_columns if col not in frame.columns]
+            if missing:
+                raise ValueError(f"missing feature columns: {', '.join(missing)}")
+            features = frame[self.feature_columns].astype(np.float32)
+        except Exception:
+            with self.lock:
+                self.counters["errors"] += 1
+            raise
+        future = Future()
+        self.pending.put((features, future, time.perf_counter()))
+        return future
+
+    def _run(self):
+        while True:
+            batch = [self.pending.get()]
+            rows = len(batch[0][0])
+            deadline = time.perf_counter() + self.max_wait
+            while rows < self.max_batch_rows:
+                try:
+                    item = self.pending.get(timeout=max(0, deadline - time.perf_counter()))
+                except queue.Empty:
+                    break
+                batch.append(item)
+                rows += len(item[0])
+            self._predict(batch, rows)
+
+    def _predict(self, batch, rows):
+        try:
+            predictions = self.predict_fn(pd.concat([frame for frame, _, _ in batch], ignore_index=True))
+        except Exception as error:
+            if len(batch) > 1:
+                # Predict every request on its own, so only the ones that fail get the error
+                for item in batch:
+                    self._predict([item], len(item[0]))
+                return
+            batch[0][1].set_exception(error)
+            with self.lock:
+                self.counters["errors"] += 1
+            return
+
+        done = time.perf_counter()
+        offsets = np.cumsum([0] + [len(frame) for frame, _, _ in batch])
+        for (_, future, received), start, stop in zip(batch, offsets[:-1], offsets[1:]):
+            future.set_result(predictions[start:stop])
+            self.latencies.append(done - received)
+        with self.lock:
+            self.counters["requests"] += len(batch)
+            self.counters["rows"] += rows
+            self.counters["batches"] += 1
+
+    def metrics(self):
+        with self.lock:
+            counters = dict(self.counters)
+        latencies = np.array(self.latencies) * 1000
+        elapsed = time.time() - self.started
+        counters.update({
+            "uptime_s": elapsed,
+            "rows_per_s": counters["rows"] / elapsed if elapsed else 0.0,
+            "mean_batch_rows": counters["rows"] / counters["batches"] if counters["batches"] else 0.0,
+            "latency_ms": {f"p{q}": float(np.percentile(latencies, q)) for q in (50, 90, 99)} if len(latencies) else {},
+        })
+        return counters
+
+
+def parse_body(body, content_type):
+    '''Turn a request body into a dataframe according to its content type.'''
+    if content_type.startswith("text/csv"):
+        return pd.read_csv(io.BytesIO(body))
+    if content_type.startswith("application/vnd.apache.arrow"):
+        import pyarrow as pa
+        return pa.ipc.open_stream(body).read_all().to_pandas()
+    payload = json.loads(body)
+    if isinstance(payload, dict):
+        return pd.DataFrame(payload["data"], columns=payload["columns"])
+    return pd.DataFrame.from_records(payload)
+
+
+def make_preprocessor(stats, vocabulary, competitors=None):
+    '''Return the function that prepares a request frame like 5a_User_Prediction.py: competitor features from Lat/Long
+    against the stored stores, then filling and encoding with the statistics and vocabulary saved at training time.'''
+    def prepare(frame):
+        if competitors is not None:
+            frame = add_competitor_features(frame, competitors)
+        return encode(imputer.transform(frame, stats), vocabulary, sparse_columns=False)
+    return prepare
+
+
+def make_handler(batcher, model_name):
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, status, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/metrics":
+                self._reply(200, batcher.metrics())
+            elif self.path == "/health":
+                self._reply(200, {"model": model_name, "feature_columns": batcher.feature_columns})
+            else:
+                self._reply(404, {"error": "unknown endpoint"})
+
+        def do_POST(self):
+            if self.path != "/predict":
+                self._reply(404, {"error": "unknown endpoint"})
+                return
+            try:
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                frame = parse_body(body, self.headers.get("Content-Type", "application/json"))
+                predictions = batcher.submit(frame).result()
+            except Exception as error:
+                self._reply(400, {"error": str(error)})
+            else:
+                self._reply(200, {"predictions": predictions.tolist()})
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve potential predictions from the registered model.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--model", default="fater_model", help="name of the registered model")
+    parser.add_argument("--stores", default="stores_NA.csv", help="stores csv the competitor features are counted against")
+    parser.add_argument("--max-batch-rows", type=int, default=4096, help="largest number of rows predicted in one call")
+    parser.add_argument("--max-wait-ms", type=float, default=5, help="how long a request waits for others to join its batch")
+    args = parser.parse_args()
+
+    try:
+        compiled, meta = load_compiled_model(args.model)
+        predict_fn = lambda frame: predict(compiled, frame)
+    except FileNotFoundError:
+        # Models that are not random forests have no compiled arrays, they were fit on a matrix without column
+        # names and get the feature columns as a plain array
+        model, meta = load_model(args.model)
+        predict_fn = lambda frame: model.predict(frame.to_numpy(dtype=np.float32))
+    # The stored stores, the imputation statistics and the one-hot vocabulary are loaded once and prepare every request
+    prepare_fn = make_preprocessor(imputer.load(), load_vocabulary(), pd.read_csv(args.stores).rename(columns=STORE_COLUMNS))
+    batcher = MicroBatcher(predict_fn, meta["feature_columns"], prepare_fn, args.max_batch_rows, args.max_wait_ms)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(batcher, args.model))
+    print(f"Serving {args.model} on http://{args.host}:{args.port}")
+    server.serve_forever()
@@ -0,0 +1,200 @@
+''' title: "Partitioned multi-province ingest"
+    author: "Raza Mehar | Najam Mehdi | Pujan Thapa"
+    date: "2026-10-18"
+    description: Running the geo-join, renaming and merging of 1_Explore_Pre_process.py for every province found in
+                 the data folder (stores_<code>.csv, shapes_<code>.csv, socio_demo_<code>.csv, gravitation_<code>.csv),
+                 one partition per process with the number of processes bounded by a memory budget. Stores near a
+                 border are also matched against the microcodes of the neighbouring provinces, and the stores of the
+                 neighbouring provinces count as competitors. Every partition is written to
+                 1_stores_with_microcodes/province=<code>/, then the partitions are streamed one by one into the
+                 shared 1_stores_with_microcodes.parquet.
+
+    usage: python province_ingest.py [CODE ...] [--jobs N] [--memory-budget-mb MB] [--wide-gravitation]'''
+
+# Import relevant packages and modules
+import argparse
+import glob
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import shapely
+from competitor_features import competitor_features
+from geo_utils import store_points, assign_microcodes, report_unmatched
+from geometry_cache import CACHE_DIR, load_geometries, read_csv_with_geometry
+from gravitation_features import pivot_gravitation
+from stage_io import stage_path, write_stage
+from instrument import step
+
+INPUT_KINDS = ["stores", "shapes", "socio_demo", "gravitation"]
+STAGE_NAME = "1_stores_with_microcodes"
+# Peak memory of a partition relative to the size of its csv files, measured on the Naples data
+MEMORY_FACTOR = 8
+# Stores up to this distance (degrees, about 5 km) outside a province's polygons can still match a neighbour
+BORDER_MARGIN = 0.05
+STORE_COLUMNS = {'Cod3HD': "store_ID", 'Insegna': "store_name", 'TipologiaPdV': "store_type", 'MQVEND': "store_size",
+                 'Indirizzo': "address", 'Provincia': "province", 'Potenziale': "potential"}
+
+
+def build_stores(stores, shapes, demographics, gravitation, wide_gravitation=False, competitors=None):
+    '''Assign every store to the microcode polygon containing it and join the demographics and gravitation.
+
+    When shapes hold the polygons of several provinces, the first ones (the store's own province) win on borders.
+    The competitor features count the stores of competitors (raw stores csv rows) around every store, all of
+    stores by default.'''
+    # Rename the column names to make them standard across the datasets
+    gravitation = gravitation.rename(columns= {"fasciaoraria": "time_slot", "media_annuale": "annual_average"})
+    stores = stores.rename(columns= STORE_COLUMNS)
+
+    # Create Shapely Point objects for each store
+    stores['Point'] = store_points(stores)
+
+    # Assign the microcode of the containing polygon to each store with one bulk query on a spatial index
+    with step("geo_join") as s:
+        stores['microcode'] = assign_microcodes(stores['Point'], shapes['geometry'], shapes['microcode']).to_numpy()
+        s.record(stores)
+    report_unmatched(stores)
+
+    # Count the competing stores around every store while the coordinates are still there
+    with step("competitors") as s:
+        competitors = stores if competitors is None else competitors.rename(columns= STORE_COLUMNS)
+        stores = s.record(stores.join(competitor_features(stores, competitors)))
+
+    # Join all the demographics and gravitation dataframes on "microcode" with stores dataframe and drop irrelevant features
+    with step("merge") as s:
+        stores = pd.merge(stores, demographics, on="microcode", how = "left")
+        if wide_gravitation:
+            gravitation = pivot_gravitation(gravitation)
+        stores = pd.merge(stores, gravitation, on="microcode", how = "left")
+        stores.drop(["Lat", "Long", "province_x", "district", "store_name", "address", "region", "province_y", "Unnamed: 0"], inplace=True, axis=1)
+        s.record(stores)
+    return stores
+
+
+def input_path(kind, code, data_dir="."):
+    return os.path.join(data_dir, f"{kind}_{code}.csv")
+
+
+def geometry_cache_dir(data_dir="."):
+    '''The geometry cache lives in the data folder, whatever the working directory of the run.'''
+    return os.path.join(data_dir, CACHE_DIR)
+
+
+def discover_provinces(data_dir="."):
+    '''Return the province codes that have all four input files.'''
+    codes = [re.fullmatch(r"stores_(.+)\.csv", os.path.basename(path)).group(1)
+             for path in glob.glob(os.path.join(data_dir, "stores_*.csv"))]
+    return sorted(code for code in codes if all(os.path.exists(input_path(kind, code, data_dir)) for kind in INPUT_KINDS))
+
+
+def province_bounds(codes, data_dir="."):
+    '''Return the bounding box (min x, min y, max x, max y) of the polygons and stores of every province.
+
+    The polygons come from the geometry cache, so after the first run this does not parse any WKT.'''
+    bounds = {}
+    for code in codes:
+        shapes = load_geometries(input_path("shapes", code, data_dir), "geometry", geometry_cache_dir(data_dir))
+        stores = pd.read_csv(input_path("stores", code, data_dir), usecols=["Long", "Lat"])
+        shape_box = shapely.total_bounds(shapes)
+        bounds[code] = (min(shape_box[0], stores["Long"].min()), min(shape_box[1], stores["Lat"].min()),
+                        max(shape_box[2], stores["Long"].max()), max(shape_box[3], stores["Lat"].max()))
+    return bounds
+
+
+def neighbours(code, bounds, margin=BORDER_MARGIN):
+    '''Return the provinces whose bounding box comes within margin of the bounding box of code.'''
+    x0, y0, x1, y1 = bounds[code]
+    return [other for other, (a0, b0, a1, b1) in bounds.items()
+            if other != code and a0 <= x1 + margin and a1 >= x0 - margin and b0 <= y1 + margin and b1 >= y0 - margin]
+
+
+def ingest_partition(code, neighbour_codes, data_dir=".", out_dir=STAGE_NAME, wide_gravitation=False):
+    '''Run the ingest of one province and write it to <out_dir>/province=<code>/part-0.parquet.'''
+    stores = pd.read_csv(input_path("stores", code, data_dir))
+    shapes = [read_csv_with_geometry(input_path("shapes", code, data_dir), "geometry", geometry_cache_dir(data_dir))]
+    demographics = [pd.read_csv(input_path("socio_demo", code, data_dir))]
+    gravitation = [pd.read_csv(input_path("gravitation", code, data_dir))]
+
+    # Neighbouring polygons go after the province's own ones, so they only match stores outside the province
+    competitors = [stores]
+    for other in neighbour_codes:
+        competitors.append(pd.read_csv(input_path("stores", other, data_dir)))
+        shapes.append(read_csv_with_geometry(input_path("shapes", other, data_dir), "geometry", geometry_cache_dir(data_dir)))
+    shapes = pd.concat(shapes, ignore_index=True)
+    matched = set(assign_microcodes(store_points(stores), shapes["geometry"], shapes["microcode"]).dropna())
+    for other in neighbour_codes:
+        other_demographics = pd.read_csv(input_path("socio_demo", other, data_dir))
+        demographics.append(other_demographics[other_demographics["microcode"].isin(matched)])
+        other_gravitation = pd.read_csv(input_path("gravitation", other, data_dir))
+        gravitation.append(other_gravitation[other_gravitation["microcode"].isin(matched)])
+
+    stores = build_stores(stores, shapes, pd.concat(demographics, ignore_index=True),
+                          pd.concat(gravitation, ignore_index=True), wide_gravitation,
+                          pd.concat(competitors, ignore_index=True))
+
+    directory = os.path.join(out_dir, f"province={code}")
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, "part-0")
+    write_stage(stores, path)
+    return code, stage_path(path), len(stores)
+
+
+def combine_partitions(paths, output):
+    '''Stream the partition files into one Parquet file, one partition in memory at a time.
+
+    Column types are widened to fit every partition (e.g. int8 and int16 become int16) and columns missing from a
+    partition are filled with nulls.'''
+    schemas = [pq.read_schema(path) for path in paths]
+    schema = pa.unify_schemas([s.remove_metadata() for s in schemas], promote_options="permissive")
+    geo = (schemas[0].metadata or {}).get(b"geo")
+    schema = schema.with_metadata({b"geo": geo} if geo else None)
+
+    with pq.ParquetWriter(output, schema) as writer:
+        for path in paths:
+            table = pq.read_table(path)
+            for field in schema:
+                if field.name not in table.column_names:
+                    table = table.append_column(field.name, pa.nulls(len(table), field.type))
+            writer.write_table(table.select(schema.names).cast(schema))
+
+
+def worker_count(codes, jobs, memory_budget_mb, data_dir="."):
+    '''Number of partitions that can run at once without their estimated memory exceeding the budget.'''
+    sizes = [sum(os.path.getsize(input_path(kind, code, data_dir)) for kind in INPUT_KINDS) for code in codes]
+    per_partition = MEMORY_FACTOR * max(sizes) / 2 ** 20
+    return int(max(1, min(jobs, len(codes), memory_budget_mb // max(per_partition, 1))))
+
+
+def run(codes=None, data_dir=".", jobs=os.cpu_count(), memory_budget_mb=4096, wide_gravitation=False):
+    codes = codes or discover_provinces(data_dir)
+    if not codes:
+        raise SystemExit(f"No complete set of province input files found in {data_dir}")
+    bounds = province_bounds(codes, data_dir)
+    # Largest partitions first, so a big one does not start last and hold up the end of the run
+    codes = sorted(codes, key=lambda code: -os.path.getsize(input_path("stores", code, data_dir)))
+    workers = worker_count(codes, jobs, memory_budget_mb, data_dir)
+    print(f"Ingesting {len(codes)} provinces with {workers} processes.")
+
+    out_dir = os.path.join(data_dir, STAGE_NAME)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(ingest_partition, code, neighbours(code, bounds), data_dir, out_dir, wide_gravitation)
+                   for code in codes]
+        results = sorted(future.result() for future in futures)
+    for code, path, n_rows in results:
+        print(f"{code}: {n_rows} rows -> {path}")
+
+    combine_partitions([path for _, path, _ in results], os.path.join(data_dir, stage_path(STAGE_NAME)))
+    print(f"All provinces have been saved in {stage_path(STAGE_NAME)}.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the stage 1 ingest for several provinces.")
+    parser.add_argument("codes", nargs="*", help="province codes, all provinces in the data folder by default")
+    parser.add_argument("--data-dir", default=".")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="largest number of processes")
+    parser.add_argument("--memory-budget-mb", type=float, default=4096, help="memory the partitions may use together")
+    parser.add_argument("--wide-gravitation", action="store_true", help="pivot gravitation like WIDE_GRAVITATION in stage 1")
+    args = parser.parse_args()
+    run(args.codes, args.data_dir, args.jobs, args.memory_budget_mb, args.wide_gravitation)
@@ -0,0 +1,87 @@
+''' title: "Headless report rendering"
+    author: "Raza Mehar | Najam Mehdi | Pujan Thapa"
+    date: "2026-10-18"
+    description: Showing the figures of the analysis scripts interactively, or, when FATER_REPORT_DIR is set, rendering
+                 them with a non-interactive backend in a process pool and writing them to PNG/SVG files with an
+                 index page.
+
+    environment: FATER_REPORT_DIR      folder the figures are written to (enables report mode)
+                 FATER_REPORT_FORMATS  comma separated file formats, "png" by default
+                 FATER_REPORT_JOBS     number of rendering processes, all cores by default'''
+
+# Import relevant packages and modules
+import html
+import multiprocessing
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+import matplotlib
+
+REPORT_DIR = os.environ.get("FATER_REPORT_DIR")
+FORMATS = os.environ.get("FATER_REPORT_FORMATS", "png").split(",")
+JOBS = int(os.environ.get("FATER_REPORT_JOBS", 0)) or None
+
+if REPORT_DIR:
+    matplotlib.use("Agg")
+
+import matplotlib.pyplot as plt
+
+_jobs = []
+
+
+def report_mode():
+    return REPORT_DIR is not None
+
+
+def show(name, plot, *args, **kwargs):
+    '''Draw a figure by calling plot(*args, **kwargs).
+
+    Interactively the figure is shown right away. In report mode the arguments are snapshotted and the figure is
+    rendered to <FATER_REPORT_DIR>/<name>.<format> when finish() is called.'''
+    if not report_mode():
+        plot(*args, **kwargs)
+        plt.show()
+        return
+    _jobs.append((name, plot, pickle.dumps((args, kwargs))))
+
+
+def _render(name, plot, payload):
+    args, kwargs = pickle.loads(payload)
+    plot(*args, **kwargs)
+    paths = []
+    for fmt in FORMATS:
+        path = os.path.join(REPORT_DIR, f"{name}.{fmt}")
+        plt.gcf().savefig(path, bbox_inches="tight")
+        paths.append(path)
+    plt.close("all")
+    return paths
+
+
+def finish():
+    '''Render the queued figures in parallel and refresh the index page. Does nothing outside report mode.'''
+    if not report_mode() or not _jobs:
+        return
+    os.makedirs(REPORT_DIR, exist_ok=True)
+
+    # The plot functions live in the calling script, so workers are forked after all of them have been defined.
+    # Where fork is not available the figures are rendered one after another in this process.
+    if "fork" in multiprocessing.get_all_start_methods() and len(_jobs) > 1:
+        with ProcessPoolExecutor(max_workers=JOBS, mp_context=multiprocessing.get_context("fork")) as pool:
+            futures = [pool.submit(_render, *job) for job in _jobs]
+            paths = [path for future in futures for path in future.result()]
+    else:
+        paths = [path for job in _jobs for path in _render(*job)]
+    _jobs.clear()
+
+    write_index()
+    print(f"{len(paths)} figure files have been written to {REPORT_DIR}.")
+
+
+def write_index():
+    '''Write index.html listing every figure in the report folder, so several scripts can share one report.'''
+    figures = sorted(f for f in os.listdir(REPORT_DIR) if f.rsplit(".", 1)[-1] in ("png", "svg"))
+    items = "\n".join(f'<figure><img src="{html.escape(f)}" style="max-width:100%">'
+                      f'<figcaption>{html.escape(f)}</figcaption></figure>' for f in figures)
+    with open(os.path.join(REPORT_DIR, "index.html"), "w") as f:
+        f.write(f"<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>Report</title></head>\n"
+                f"<body>\n<h1>Report</h1>\n{items}\n</body></html>\n")
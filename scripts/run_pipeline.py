@@ -0,0 +1,207 @@
+''' title: "Incremental pipeline runner"
+    author: "Raza Mehar | Najam Mehdi | Pujan Thapa"
+    date: "2026-10-18"
+    description: Declares the stage graph with the inputs and outputs of every script, fingerprints each stage (script
+                 source, local helper modules, input file contents and parameters) and only re-runs the stages whose
+                 fingerprint changed or whose outputs are missing. Independent stages run in parallel processes.
+
+    usage: python run_pipeline.py [STAGE ...] [--data-dir DIR] [--jobs N] [--force] [--dry-run] [--report-dir DIR]
+                              [--trace FILE] [--quiet]'''
+
+# Import relevant packages and modules
+import argparse
+import hashlib
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+STATE_FILE = ".pipeline_state.json"
+RAW_INPUTS = ["stores_NA.csv", "shapes_NA.csv", "socio_demo_NA.csv", "gravitation_NA.csv"]
+
+# Stage graph: script, input files, output files, upstream stages and parameters that are part of the fingerprint
+STAGES = {
+    "1": {"script": "1_Explore_Pre_process.py", "inputs": RAW_INPUTS,
+          "outputs": ["1_stores_with_microcodes.parquet"], "deps": []},
+    "1b": {"script": "1b_Explore_Pre_process.py", "inputs": RAW_INPUTS, "outputs": [], "deps": []},
+    "2": {"script": "2_Pre-process.py", "inputs": ["1_stores_with_microcodes.parquet"],
+          "outputs": ["2_stores_preprocessed.parquet"], "deps": ["1"]},
+    "3a": {"script": "3a_Analyze.py", "inputs": ["2_stores_preprocessed.parquet"],
+           "outputs": ["3_stores_encoded.parquet"], "deps": ["2"]},
+    "3b": {"script": "3b_Analyze.py", "inputs": ["2_stores_preprocessed.parquet"], "outputs": [], "deps": ["2"]},
+    "3c": {"script": "3c_Analyze .py", "inputs": ["2_stores_preprocessed.parquet"],
+           "outputs": ["4_top_20_percent_stores.csv"], "deps": ["2"]},
+    "3d": {"script": "3d_Analyze.py", "inputs": ["3_stores_encoded.parquet"],
+           "outputs": ["5_holdout_set.parquet"], "deps": ["3a"]},
+    "3e": {"script": "3e_Analyze.py", "inputs": ["3_stores_encoded.parquet"], "outputs": [], "deps": ["3a"]},
+    "3f": {"script": "3f_Analyze.py", "inputs": ["3_stores_encoded.parquet"],
+           "outputs": ["artifacts/latest/fater_model.json"], "deps": ["3a"]},
+    "3g": {"script": "3g_Analyze.py", "inputs": ["3_stores_encoded.parquet"],
+           "outputs": ["decision_tree.pdf"], "deps": ["3a"]},
+    "4a": {"script": "4a_Forecasting.py",
+           "inputs": ["ISTAT_Child_Births_Data_2024.csv", "ISTAT_Population_Data_2024.csv", "socio_demo_NA.csv"],
+           "outputs": ["4_microcode_demand.parquet"], "deps": []},
+    "5a": {"script": "5a_User_Prediction.py", "inputs": ["artifacts/latest/fater_model.json", "dummy.csv"],
+           "outputs": [], "deps": ["3f"]},
+}
+
+
+def file_digest(path, digests):
+    '''Hash a file's content, reusing the previous digest when its size and modification time are unchanged.'''
+    stat = os.stat(path)
+    key = f"{stat.st_size}|{stat.st_mtime_ns}"
+    cached = digests.get(path)
+    if cached and cached["key"] == key:
+        return cached["sha256"]
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha.update(block)
+    digests[path] = {"key": key, "sha256": sha.hexdigest()}
+    return digests[path]["sha256"]
+
+
+def local_modules(script):
+    '''Return the helper modules from the scripts folder that a script imports, directly or through other helpers.'''
+    found, pending = set(), [script]
+    while pending:
+        with open(os.path.join(SCRIPTS_DIR, pending.pop())) as f:
+            names = re.findall(r"^\s*(?:from|import)\s+(\w+)", f.read(), flags=re.MULTILINE)
+        for name in names:
+            module = f"{name}.py"
+            if module not in found and os.path.exists(os.path.join(SCRIPTS_DIR, module)):
+                found.add(module)
+                pending.append(module)
+    return sorted(found)
+
+
+def fingerprint(stage, data_dir, digests):
+    spec = STAGES[stage]
+    sha = hashlib.sha256(json.dumps(spec.get("params", {}), sort_keys=True).encode())
+    for source in [spec["script"]] + local_modules(spec["script"]):
+        sha.update(source.encode())
+        sha.update(file_digest(os.path.join(SCRIPTS_DIR, source), digests).encode())
+    for name in spec["inputs"]:
+        sha.update(name.encode())
+        sha.update(file_digest(os.path.join(data_dir, name), digests).encode())
+    return sha.hexdigest()
+
+
+def required_stages(targets):
+    '''Return the targets together with all their upstream stages.'''
+    needed, pending = set(), list(targets)
+    while pending:
+        stage = pending.pop()
+        if stage not in needed:
+            needed.add(stage)
+            pending.extend(STAGES[stage]["deps"])
+    return needed
+
+
+def run_stage(stage, data_dir, report_dir=None, trace=None, quiet=False):
+    env = dict(os.environ)
+    # Figures cannot be shown from a batch run, they are either dropped or written to the report folder
+    env.setdefault("MPLBACKEND", "Agg")
+    if report_dir:
+        env["FATER_REPORT_DIR"] = os.path.abspath(report_dir)
+    if trace:
+        env["FATER_TRACE"] = os.path.abspath(trace)
+    if quiet:
+        env["FATER_QUIET"] = "1"
+    start = time.perf_counter()
+    with open(os.path.join(data_dir, f".pipeline_{stage}.log"), "w") as log:
+        result = subprocess.run([sys.executable, os.path.join(SCRIPTS_DIR, STAGES[stage]["script"])],
+                                cwd=data_dir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    return result.returncode, time.perf_counter() - start
+
+
+def run_pipeline(targets=None, data_dir=".", jobs=None, force=False, dry_run=False, report_dir=None, trace=None,
+                 quiet=False):
+    '''Run the requested stages (all by default) and their upstream stages, skipping those that are up to date.
+
+    Returns the status of every stage: "skipped", "done", "failed", "missing inputs" or "blocked".'''
+    state_path = os.path.join(data_dir, STATE_FILE)
+    state = {"stages": {}, "digests": {}}
+    if os.path.exists(state_path):
+        with open(state_path) as f:
+            state = json.load(f)
+
+    pending = required_stages(targets or STAGES)
+    status, running = {}, {}
+
+    with ThreadPoolExecutor(max_workers=jobs or os.cpu_count()) as pool:
+        while pending or running:
+            for stage in sorted(pending):
+                deps = STAGES[stage]["deps"]
+                if any(status.get(dep) in ("failed", "missing inputs", "blocked") for dep in deps):
+                    status[stage] = "blocked"
+                elif all(status.get(dep) in ("skipped", "done") for dep in deps):
+                    if dry_run and any(status[dep] == "done" for dep in deps):
+                        status[stage] = "done"
+                        print(f"[{stage}] would run")
+                    elif not all(os.path.exists(os.path.join(data_dir, name)) for name in STAGES[stage]["inputs"]):
+                        status[stage] = "missing inputs"
+                        print(f"[{stage}] missing inputs")
+                    else:
+                        digest = fingerprint(stage, data_dir, state["digests"])
+                        outputs_exist = all(os.path.exists(os.path.join(data_dir, name)) for name in STAGES[stage]["outputs"])
+                        if not force and outputs_exist and state["stages"].get(stage) == digest:
+                            status[stage] = "skipped"
+                            print(f"[{stage}] up to date")
+                        elif dry_run:
+                            status[stage] = "done"
+                            print(f"[{stage}] would run")
+                        else:
+                            print(f"[{stage}] running {STAGES[stage]['script']}")
+                            running[pool.submit(run_stage, stage, data_dir, report_dir, trace, quiet)] = (stage, digest)
+                            status[stage] = "running"
+                if stage in status:
+                    pending.discard(stage)
+
+            if not running:
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage, digest = running.pop(future)
+                returncode, seconds = future.result()
+                if returncode == 0:
+                    status[stage] = "done"
+                    state["stages"][stage] = digest
+                    print(f"[{stage}] done in {seconds:.1f}s")
+                else:
+                    status[stage] = "failed"
+                    state["stages"].pop(stage, None)
+                    print(f"[{stage}] failed, see .pipeline_{stage}.log")
+
+    if not dry_run:
+        # Written next to the final file and swapped in, an interrupted run leaves the previous state intact
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(state_path)), suffix=".json")
+        with os.fdopen(fd, "w") as f:
+            json.dump(state, f, indent=1)
+        os.replace(tmp_path, state_path)
+    return status
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the pipeline stages that are out of date.")
+    parser.add_argument("stages", nargs="*", help=f"stages to bring up to date, out of {', '.join(STAGES)} (default: all)")
+    parser.add_argument("--data-dir", default=".", help="folder holding the input and output files")
+    parser.add_argument("--jobs", type=int, default=None, help="number of stages run at the same time")
+    parser.add_argument("--force", action="store_true", help="run the stages even if they are up to date")
+    parser.add_argument("--dry-run", action="store_true", help="only list the stages that would run")
+    parser.add_argument("--report-dir", default=None, help="write the figures of the stages that run to this folder")
+    parser.add_argument("--trace", default=None, help="append the timing of every step to this JSON-lines file")
+    parser.add_argument("--quiet", action="store_true", help="skip the console diagnostics of the stages")
+    args = parser.parse_args()
+    unknown = [stage for stage in args.stages if stage not in STAGES]
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(unknown)}")
+
+    status = run_pipeline(args.stages, args.data_dir, args.jobs, args.force, args.dry_run, args.report_dir,
+                          args.trace, args.quiet)
+    sys.exit(1 if "failed" in status.values() else 0)
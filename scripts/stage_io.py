@@ -0,0 +1,106 @@
+''' title: "Typed columnar hand-off between stages"
+    author: "Raza Mehar | Najam Mehdi | Pujan Thapa"
+    date: "2026-10-18"
+    description: Writing and reading the intermediate datasets (1_stores_with_microcodes, 2_stores_preprocessed,
+                 3_stores_encoded, 5_holdout_set) as Parquet files with an explicit schema: categoricals for the
+                 repeated labels, compact numeric widths and WKB geometry (GeoParquet). Stages can read only the
+                 columns they need.'''
+
+# Import relevant packages and modules
+import json
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import shapely
+from geometry_cache import load_geometries
+
+CATEGORICAL_COLUMNS = ["store_type", "daytype", "time_slot", "datatype", "microcode", "Comune"]
+GEOMETRY_COLUMNS = ["Point"]
+# The target keeps full precision, every other float is stored as float32
+FULL_PRECISION_COLUMNS = ["potential"]
+# Rows converted to Arrow at a time when a stage output has sparse columns
+WRITE_BATCH_ROWS = 100_000
+
+
+def stage_path(name):
+    return f"{name}.parquet"
+
+
+def apply_schema(df):
+    '''Return a copy of the dataframe with the stage schema applied to the columns it has.'''
+    df = df.copy()
+    for col in df.columns:
+        if col in CATEGORICAL_COLUMNS:
+            df[col] = df[col].astype("category")
+        elif col in GEOMETRY_COLUMNS or col in FULL_PRECISION_COLUMNS:
+            continue
+        elif pd.api.types.is_bool_dtype(df[col]):
+            continue
+        elif pd.api.types.is_integer_dtype(df[col]):
+            df[col] = pd.to_numeric(df[col], downcast="integer")
+        elif pd.api.types.is_float_dtype(df[col]):
+            df[col] = df[col].astype("float32")
+    return df
+
+
+def _tables(df, batch_rows=WRITE_BATCH_ROWS):
+    '''Arrow tables of the dataframe, sparse columns are densified one slice of rows at a time.'''
+    sparse_columns = {col: df[col].dtype.subtype for col in df.columns if isinstance(df[col].dtype, pd.SparseDtype)}
+    if not sparse_columns or len(df) <= batch_rows:
+        yield pa.Table.from_pandas(df.astype(sparse_columns), preserve_index=False)
+        return
+    for start in range(0, len(df), batch_rows):
+        yield pa.Table.from_pandas(df.iloc[start:start + batch_rows].astype(sparse_columns), preserve_index=False)
+
+
+def write_stage(df, name):
+    '''Save a stage output as <name>.parquet, geometry columns are encoded as WKB with GeoParquet metadata.
+
+    Sparse columns (e.g. the one-hot columns of 3a) are stored as dense columns, written in slices of rows.'''
+    df = apply_schema(df)
+    geometry_columns = [col for col in GEOMETRY_COLUMNS if col in df.columns]
+    for col in geometry_columns:
+        df[col] = shapely.to_wkb(df[col].to_numpy())
+
+    if geometry_columns:
+        geo = {"version": "1.0.0", "primary_column": geometry_columns[0],
+               "columns": {col: {"encoding": "WKB", "geometry_types": []} for col in geometry_columns}}
+    writer = None
+    for table in _tables(df):
+        if geometry_columns:
+            table = table.replace_schema_metadata({**table.schema.metadata, b"geo": json.dumps(geo).encode()})
+        if writer is None:
+            writer = pq.ParquetWriter(stage_path(name), table.schema)
+        writer.write_table(table)
+    writer.close()
+
+
+def read_stage(name, columns=None):
+    '''Load a stage output, optionally only some of its columns, with geometry columns decoded to Shapely objects.
+
+    Falls back to <name>.csv for outputs written before the Parquet hand-off.'''
+    path = stage_path(name)
+    if not os.path.exists(path):
+        return _read_stage_csv(f"{name}.csv", columns)
+
+    df = pd.read_parquet(path, columns=columns)
+    for col in GEOMETRY_COLUMNS:
+        if col in df.columns:
+            df[col] = shapely.from_wkb(df[col].to_numpy())
+    return df
+
+
+def iter_stage(name, columns=None, batch_size=100_000):
+    '''Yield a stage output in dataframes of at most batch_size rows, for stages that do not fit in memory.'''
+    for batch in pq.ParquetFile(stage_path(name)).iter_batches(batch_size=batch_size, columns=columns):
+        yield batch.to_pandas()
+
+
+def _read_stage_csv(path, columns):
+    header = pd.read_csv(path, nrows=0).columns
+    geometry_columns = [col for col in GEOMETRY_COLUMNS if col in header and (columns is None or col in columns)]
+    df = pd.read_csv(path, usecols=lambda c: c not in geometry_columns and (columns is None or c in columns))
+    for col in geometry_columns:
+        df[col] = load_geometries(path, col)
+    return apply_schema(df[[col for col in header if col in df.columns]])
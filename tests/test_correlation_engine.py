@@ -0,0 +1,26 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "scripts"))
+
+from correlation_engine import correlate, vif_selection
+
+
+def test_vif_selection_drops_collinear_column_with_missing_values():
+    rng = np.random.default_rng(0)
+    n = 400
+    df = pd.DataFrame({"q": rng.normal(size=n), "r": rng.normal(size=n), "u": rng.normal(size=n)})
+    df["t"] = df["q"] + df["r"]
+    df.loc[rng.random(n) < 0.3, "u"] = np.nan
+    df["v"] = df["u"] + rng.normal(scale=0.5, size=n)
+    df.loc[rng.random(n) < 0.3, "v"] = np.nan
+
+    report = vif_selection(correlate(df, list(df.columns)), threshold=10).set_index("feature")
+
+    assert (report["vif"] > 0).all()
+    assert report["dropped"].sum() == 1
+    assert report.loc[["q", "r", "t"], "dropped"].any()
+    assert not report.loc[["u", "v"], "dropped"].any()
@@ -0,0 +1,66 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestRegressor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "scripts"))
+
+import imputer
+from artifacts import load_compiled_model, save_model
+from competitor_features import competitor_features
+from forest_engine import predict
+from onehot_encoder import design_matrix, fit_vocabulary, load_vocabulary, save_vocabulary
+from prediction_server import MicroBatcher, make_preprocessor
+
+
+def test_predicts_raw_candidate_stores_end_to_end(tmp_path, monkeypatch):
+    # The artifacts are written relative to the working directory, like in the data folder
+    monkeypatch.chdir(tmp_path)
+    rng = np.random.default_rng(0)
+    n = 300
+    stores = pd.DataFrame({"store_ID": np.arange(n), "store_type": rng.choice(["DIS", "IPR", "SUP"], n),
+                           "store_size": rng.uniform(100, 5000, n), "Parking": rng.integers(0, 2, n),
+                           "Lat": 40.85 + rng.normal(scale=0.02, size=n), "Long": 14.25 + rng.normal(scale=0.02, size=n)})
+    train = stores.join(competitor_features(stores)).drop(columns=["Lat", "Long"])
+    train["potential"] = rng.random(n)
+
+    vocabulary = fit_vocabulary(train, ["store_type"])
+    save_vocabulary(vocabulary)
+    imputer.save(imputer.fit(train, ["store_size"], ["store_type"]))
+    X, feature_names = design_matrix(train.drop(columns=["store_ID", "potential"]), vocabulary)
+    forest = RandomForestRegressor(n_estimators=10, random_state=0).fit(X, train["potential"])
+    save_model("fater_model", forest, feature_names, "split")
+
+    # Candidate stores with the raw store fields and their coordinates only, one without a size
+    raw = pd.DataFrame({"store_type": ["SUP", "IPR"], "store_size": [1200.0, np.nan], "Parking": [1, 0],
+                        "Lat": [40.86, 40.84], "Long": [14.26, 14.24]})
+    expected_inputs = raw.assign(store_size=raw["store_size"].fillna(train["store_size"].median()))
+    expected_inputs = expected_inputs.join(competitor_features(expected_inputs.assign(store_ID=-1), stores))
+    expected = forest.predict(design_matrix(expected_inputs.drop(columns=["Lat", "Long"]), vocabulary)[0])
+
+    compiled, meta = load_compiled_model("fater_model")
+    batcher = MicroBatcher(lambda frame: predict(compiled, frame), meta["feature_columns"],
+                           make_preprocessor(imputer.load(), load_vocabulary(), stores))
+    np.testing.assert_allclose(batcher.submit(raw).result(timeout=10), expected)
+
+
+def test_malformed_request_fails_only_its_own_future():
+    def predict_fn(frame):
+        if (frame["a"] < 0).any():
+            raise ValueError("negative input")
+        return frame["a"].to_numpy() + frame["b"].to_numpy()
+
+    batcher = MicroBatcher(predict_fn, ["a", "b"], max_wait_ms=200)
+    with pytest.raises(ValueError):
+        batcher.submit(pd.DataFrame({"a": ["big"], "b": [1.0]}))
+    valid = batcher.submit(pd.DataFrame({"a": [1.0, 2.0], "b": [3.0, 4.0]}))
+    # Queued within the same wait, but rejected by the model: the batch is retried request by request
+    rejected = batcher.submit(pd.DataFrame({"a": [-1.0], "b": [0.0]}))
+
+    np.testing.assert_allclose(valid.result(timeout=10), [4.0, 6.0])
+    with pytest.raises(ValueError):
+        rejected.result(timeout=10)
+    assert batcher.metrics()["errors"] == 2